@@ -150,28 +150,79 @@ export default function ExamPage() {
 
   // Proctoring
   useEffect(() => {
-    const interval = setInterval(async () => {
+    const BACKEND = "http://127.0.0.1:5000";
+    let statusNow: string | null = null;
+    // Jeda antar frame ditentukan server (next_interval_ms / retry_after_ms), mulai dari 120 ms
+    let delay = 120;
+    let timer: ReturnType<typeof setTimeout> | null = null;
+    let stopped = false;
+    const applyTiming = (msg: { next_interval_ms?: number; retry_after_ms?: number }) => {
+      if (msg.retry_after_ms) delay = Math.max(delay, msg.retry_after_ms);
+      else if (msg.next_interval_ms) delay = msg.next_interval_ms;
+    };
+    let ws: WebSocket | null = new WebSocket(
+      `${BACKEND.replace(/^http/, "ws")}/proctor/stream?user_id=${encodeURIComponent(userId)}`
+    );
+    ws.binaryType = "arraybuffer";
+    ws.onmessage = (ev) => {
+      const msg = JSON.parse(ev.data);
+      applyTiming(msg);
+      if (msg.bboxes) {
+        setBBoxes(msg.bboxes.map(([x, y, w, h, label, conf]: [number, number, number, number, string, number]) => ({ x, y, w, h, label, conf })));
+      }
+      if (msg.status) {
+        statusNow = msg.status;
+        setProctorStatus(msg.status);
+      }
+      if (statusNow === "intruder") playAlarm();
+    };
+    // Kalau kanal streaming tidak tersedia, kembali ke polling POST /verify
+    ws.onerror = () => { ws = null; };
+    ws.onclose = () => { ws = null; };
+
+    const tick = async () => {
+      if (ws && ws.readyState === WebSocket.CONNECTING) return;
+      if (ws && ws.readyState === WebSocket.OPEN) {
+        // Frame sebelumnya belum terkirim: lewati tick ini daripada menumpuk antrean
+        if (ws.bufferedAmount > 0) return;
+        const canvas = webcamRef.current?.getCanvas();
+        canvas?.toBlob((blob) => {
+          if (blob && ws && ws.readyState === WebSocket.OPEN) ws.send(blob);
+        }, "image/jpeg", 0.8);
+        return;
+      }
+
       const screenshot = webcamRef.current?.getScreenshot() || null as string | null;
       if (!screenshot) return;
 
       try {
-        const BACKEND = "http://127.0.0.1:5000";
         const res = await fetch(`${BACKEND}/verify`, {
           method: "POST",
           headers: { "Content-Type": "application/json" },
-          body: JSON.stringify({ user_id: userId, image: screenshot }),
+          body: JSON.stringify({ user_id: userId, image: screenshot, preview: false }),
         });
-        if (!res.ok) return;
         const data = await res.json();
+        applyTiming(data);
+        if (!res.ok || !data.status) return;
         setBBoxes(data.bboxes || []);
         setProctorStatus(data.status);
         if (data.status === "intruder") playAlarm();
       } catch (err) {
         // Silent fail
       }
-    }, 120);
+    };
 
-    return () => clearInterval(interval);
+    const loop = async () => {
+      await tick();
+      if (!stopped) timer = setTimeout(loop, delay);
+    };
+    timer = setTimeout(loop, delay);
+
+    return () => {
+      stopped = true;
+      if (timer) clearTimeout(timer);
+      ws?.close();
+    };
   }, [userId]);
 
   // Draw bounding boxes
@@ -100,7 +100,7 @@ export default function FaceVerificationPage() {
         setStatus("training");
         setMessage(`Berhasil ekstrak ${data.faces} wajah! Training model...`);
         setProgress(70);
-        checkModelReady();
+        checkModelReady(data.job_id);
       } else {
         setStatus("error");
         setMessage("Wajah terlalu sedikit! Rekam ulang");
@@ -116,36 +116,29 @@ export default function FaceVerificationPage() {
     return shot || null;
   };
 
-  const checkModelReady = () => {
+  const checkModelReady = (jobId: string) => {
     const interval = setInterval(async () => {
       try {
-        const screenshot = await getMirroredScreenshot();
-        if (!screenshot) return;
-
-        const res = await fetch(`${BACKEND}/verify`, {
-          method: "POST",
-          headers: { "Content-Type": "application/json" },
-          body: JSON.stringify({
-            user_id: userId,
-            image: screenshot
-          }),
-        });
-
+        const res = await fetch(`${BACKEND}/train/status?job_id=${encodeURIComponent(jobId)}`);
         const data = await res.json();
 
-        if (data.status === "safe" || data.status === "user") {
+        if (data.status === "done") {
           clearInterval(interval);
           setStatus("ready");
           setMessage("MODEL SIAP! Wajah kamu sudah terdaftar");
           setProgress(100);
-        } else if (data.status === "warning") {
+        } else if (data.status === "failed" || !res.ok) {
+          clearInterval(interval);
+          setStatus("error");
+          setMessage("Training gagal! Rekam ulang");
+        } else if (data.status === "running") {
           setProgress(90);
           setMessage("Model hampir siap... tunggu sebentar");
         }
       } catch (err) {
         console.log("Backend belum nyala");
       }
-    }, 3000);
+    }, 1000);
   };
 
   useEffect(() => {
@@ -159,7 +152,8 @@ export default function FaceVerificationPage() {
           headers: { "Content-Type": "application/json" },
           body: JSON.stringify({
             user_id: userId,
-            image: screenshot
+            image: screenshot,
+            preview: false
           }),
         });
 
@@ -93,23 +93,19 @@ export default function CourseModulePage() {
     if (activeIndex > 0) handleSelectLesson(activeIndex - 1);
   };
   const completeModule = async () => {
-    for (let i = 0; i < lessons.length; i++) {
-      const payload = {
-        user_id: userId,
-        module_title: moduleTitle,
-        lesson_index: i,
-        lesson_title: lessons[i]?.title || "",
-        completed: 1,
-        last_position: (lessons[i]?.ts || 0) + 30,
-      };
-      try {
-        await fetch(`${BACKEND}/progress/update`, {
-          method: "POST",
-          headers: { "Content-Type": "application/json" },
-          body: JSON.stringify(payload),
-        });
-      } catch {}
-    }
+    const items = lessons.map((l, i) => ({
+      lesson_index: i,
+      lesson_title: l?.title || "",
+      completed: 1,
+      last_position: (l?.ts || 0) + 30,
+    }));
+    try {
+      await fetch(`${BACKEND}/progress/batch`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ user_id: userId, module_title: moduleTitle, items }),
+      });
+    } catch {}
   };
   const markCompleteAndNext = async () => {
     await reportProgress(true);
@@ -68,7 +68,6 @@ export default function SignupPage() {
           headers: { "Content-Type": "application/json" },
           body: JSON.stringify({ user_id: email.toLowerCase(), video: b64 }),
         });
-        await fetch(`${BACKEND}/train`, { method: "POST" });
         router.push("/login");
       } catch {
         setError("Enrollment failed");
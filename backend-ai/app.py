@@ -1,97 +1,162 @@
 # backend-ai/app.py
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
+from flask_sock import Sock
 from recognizer import FaceProctor
+from proctor_session import ProctorSession
+from frame_scheduler import FrameScheduler
+from training_queue import TrainingQueue
 from dss_engine import LearningPathDSS
-from config import DB_PATH, DATASET_DIR
+from exams import get_exam
+from db import get_db, init_app as init_db_pool
+from migrations import migrate
+from progress_writer import ProgressWriter
+from config import DATASET_DIR, PROGRESS_BATCH_MAX, REVIEWER_TOKEN, PREVIEW_MIN_WIDTH, PREVIEW_MAX_WIDTH
+import hmac
 import os
 import shutil
 import sqlite3
 import json
+import time
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 
 app = Flask(__name__)
 CORS(app)
+sock = Sock(app)
+init_db_pool(app)
 
 proctor = FaceProctor()
+trainer = TrainingQueue(proctor)
+scheduler = FrameScheduler(proctor)
 dss = LearningPathDSS()
-
-def get_db():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+progress_writer = ProgressWriter()
 
 def init_db():
-    with get_db() as conn:
-        conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS exam_submissions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT,
-                answers TEXT,
-                score INTEGER,
-                total INTEGER,
-                percentage REAL,
-                package TEXT,
-                weak_areas TEXT,
-                recommendations TEXT,
-                total_study_hours INTEGER,
-                created_at TEXT
-            )
-            """
-        )
-        conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT,
-                email TEXT UNIQUE,
-                password_hash TEXT,
-                created_at TEXT
-            )
-            """
-        )
-        conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS course_progress (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT,
-                module_title TEXT,
-                lesson_index INTEGER,
-                lesson_title TEXT,
-                completed INTEGER DEFAULT 0,
-                last_position REAL DEFAULT 0,
-                updated_at TEXT,
-                UNIQUE(user_id, module_title, lesson_index)
-            )
-            """
-        )
-        conn.commit()
+    migrate(get_db())
 
 init_db()
+started_at = time.time()
+
+@app.before_request
+def warm_up():
+    # ArcFace dimuat di background saat request pertama (setelah fork kalau lewat serve.py), bukan saat import
+    proctor.warm_up()
+
+@app.route("/ready", methods=["GET"])
+def ready():
+    """
+    Kapabilitas yang sudah hangat. Endpoint non-wajah siap begitu proses melayani request;
+    ?require=lbph,arcface menjawab 503 sampai semua kapabilitas yang diminta siap (health check load balancer).
+    """
+    # Worker ini mungkin belum melihat generasi model yang diterbitkan worker lain
+    proctor.refresh_model()
+    caps = {
+        "api": True,
+        "detector": not proctor.face_cascade.empty(),
+        "lbph": proctor.model_ready,
+        "arcface": proctor.arcface.state == "ready",
+    }
+    missing = [c for c in request.args.get("require", "").split(",") if c and not caps.get(c)]
+    body = {
+        "ready": not missing,
+        "capabilities": caps,
+        "arcface_state": proctor.arcface.state,
+        "uptime_s": round(time.time() - started_at, 2),
+    }
+    if missing:
+        body["missing"] = missing
+        return jsonify(body), 503
+    return jsonify(body)
 
 @app.route('/enroll', methods=['POST'])
 def enroll():
     data = request.json
     user_id = data['user_id']
     video_b64 = data['video']
-    success, count = proctor.enroll(user_id, video_b64)
-    return jsonify({"success": success, "faces": count})
+    count = proctor.extract_faces(user_id, video_b64)
+    if count < proctor.MIN_ENROLL_FACES:
+        return jsonify({"success": False, "faces": count})
+    job_id = trainer.submit(user_id)
+    return jsonify({"success": True, "faces": count, "job_id": job_id})
 
 @app.route("/train", methods=["POST"])
 def train():
-    success = proctor.train_model()
-    return jsonify({"success": success})
+    job_id = trainer.submit()
+    return jsonify({"success": True, "job_id": job_id})
+
+@app.route("/train/status", methods=["GET"])
+def train_status():
+    job_id = request.args.get("job_id")
+    proctor.refresh_model()
+    status = trainer.status(job_id)
+    if status is None:
+        return jsonify({"success": False, "error": "not_found"}), 404
+    return jsonify(status)
 
 @app.route('/verify', methods=['POST'])
 def verify():
     data = request.json
     user_id = data['user_id']
     image_b64 = data['image']
-    result = proctor.verify(image_b64, user_id)
+    preview = bool(data.get('preview', True))
+    img_bytes = proctor.decode_b64(image_b64)
+    if img_bytes is None:
+        return jsonify({"error": "Invalid image format or decoding failed"})
+    result = scheduler.submit(user_id, img_bytes, preview)
+    if "retry_after_ms" in result:
+        # Antrean penuh / frame kedaluwarsa: klien cukup mengirim frame berikutnya setelah jeda ini
+        resp = jsonify(result)
+        resp.headers["Retry-After"] = str(max(1, -(-result["retry_after_ms"] // 1000)))
+        return resp, 503
     return jsonify(result)
 
+@app.route('/proctor/stats', methods=['GET'])
+def proctor_stats():
+    return jsonify(scheduler.stats())
+
+@app.route('/proctor/preview', methods=['GET'])
+def proctor_preview():
+    # Frame ujian bersifat privat: hanya reviewer yang memegang REVIEWER_TOKEN boleh melihatnya
+    token = request.headers.get("X-Reviewer-Token", "")
+    if not REVIEWER_TOKEN or not hmac.compare_digest(token.encode(), REVIEWER_TOKEN.encode()):
+        return jsonify({"success": False, "error": "forbidden"}), 403
+    user_id = request.args.get("user_id", "")
+    try:
+        width = int(request.args.get("width", "320"))
+    except ValueError:
+        return jsonify({"success": False, "error": "invalid_width"}), 400
+    width = min(max(width, PREVIEW_MIN_WIDTH), PREVIEW_MAX_WIDTH)
+    jpeg = proctor.render_preview(user_id, width)
+    if jpeg is None:
+        return jsonify({"success": False, "error": "not_found"}), 404
+    return Response(jpeg, mimetype="image/jpeg")
+
+@sock.route('/proctor/stream')
+def proctor_stream(ws):
+    """
+    Kanal proctoring per ujian: klien mengirim frame JPEG biner, server membalas delta bbox/status.
+    Frame yang menumpuk selama frame sebelumnya diproses dibuang, hanya yang terbaru yang diverifikasi.
+    """
+    user_id = request.args.get("user_id", "")
+    session = ProctorSession(user_id)
+    try:
+        while True:
+            frame = ws.receive()
+            while True:
+                newer = ws.receive(timeout=0)
+                if newer is None:
+                    break
+                frame = newer
+                session.dropped += 1
+            if not isinstance(frame, (bytes, bytearray)):
+                continue
+            result = scheduler.submit(user_id, bytes(frame))
+            ws.send(json.dumps(session.delta(result), separators=(",", ":")))
+    finally:
+        # Kanal ditutup (atau error): frame terakhir dan tracker sesi ini tidak disimpan lebih lama
+        proctor.end_session(user_id)
+
 @app.route("/login-face", methods=["POST"])
 def login_face():
     data = request.json
@@ -117,17 +182,18 @@ def submit_exam():
     answers = data["answers"]  # list string ["1", "2", ...]
     user_id = data["user_id"]
     package = data.get("package", "pro")
-
-    # Correct answers dari soal (sesuai urutan questions di frontend)
-    correct_answers = [1,0,1,1,0,1,1,1,1,1,1,1,1,1,1,1,1,1,1,0]
-
-    result = dss.analyze_performance(user_id, answers, correct_answers, package)
+    try:
+        exam_id = get_exam(data.get("exam_id")).exam_id
+    except KeyError:
+        return jsonify({"error": "unknown_exam"}), 400
 
     with get_db() as conn:
+        result = dss.analyze_performance(user_id, answers, package, conn, exam_id)
         conn.execute(
-            "INSERT INTO exam_submissions (user_id, answers, score, total, percentage, package, weak_areas, recommendations, total_study_hours, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            "INSERT INTO exam_submissions (user_id, exam_id, answers, score, total, percentage, package, weak_areas, recommendations, total_study_hours, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
             (
                 user_id,
+                exam_id,
                 json.dumps(answers),
                 result["score"],
                 result["total"],
@@ -139,6 +205,7 @@ def submit_exam():
                 datetime.utcnow().isoformat()
             )
         )
+        dss.record_submission(conn, user_id, answers, exam_id)
         conn.commit()
 
     return jsonify(result)
@@ -193,32 +260,49 @@ def get_user():
         return jsonify({"success": False, "error": "not_found"}), 404
     return jsonify({"success": True, "user": {"id": row[0], "name": row[1], "email": row[2]}})
 
+def _progress_record(data: dict, defaults: dict = None, ts: str = None) -> tuple:
+    d = dict(defaults or {}, **data)
+    return (
+        (d.get("user_id") or "").strip(),
+        (d.get("module_title") or "").strip(),
+        int(d.get("lesson_index") or 0),
+        (d.get("lesson_title") or "").strip(),
+        1 if d.get("completed") else 0,
+        float(d.get("last_position") or 0),
+        ts or datetime.utcnow().isoformat(),
+    )
+
 @app.route("/progress/update", methods=["POST"])
 def progress_update():
-    data = request.json
-    user_id = (data.get("user_id") or "").strip()
-    module_title = (data.get("module_title") or "").strip()
-    lesson_index = int(data.get("lesson_index") or 0)
-    lesson_title = (data.get("lesson_title") or "").strip()
-    completed = 1 if data.get("completed") else 0
-    last_position = float(data.get("last_position") or 0)
-    ts = datetime.utcnow().isoformat()
+    record = _progress_record(request.json)
+    # Update posisi saja (belum completed) digabung di buffer; completed langsung ditulis
+    if not record[4]:
+        progress_writer.buffer(record)
+        return jsonify({"success": True, "buffered": True})
     with get_db() as conn:
-        conn.execute(
-            """
-            INSERT INTO course_progress (user_id, module_title, lesson_index, lesson_title, completed, last_position, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            ON CONFLICT(user_id, module_title, lesson_index) DO UPDATE SET
-                lesson_title=excluded.lesson_title,
-                completed=excluded.completed,
-                last_position=excluded.last_position,
-                updated_at=excluded.updated_at
-            """,
-            (user_id, module_title, lesson_index, lesson_title, completed, last_position, ts)
-        )
+        progress_writer.write(conn, [record])
         conn.commit()
     return jsonify({"success": True})
 
+@app.route("/progress/batch", methods=["POST"])
+def progress_batch():
+    """Banyak record lesson dalam satu request dan satu transaksi. user_id/module_title di level atas berlaku untuk semua item."""
+    data = request.json or {}
+    items = data.get("items") or []
+    if not isinstance(items, list) or len(items) > PROGRESS_BATCH_MAX:
+        return jsonify({"success": False, "error": f"items must be a list of at most {PROGRESS_BATCH_MAX}"}), 400
+    defaults = {k: data[k] for k in ("user_id", "module_title") if k in data}
+    ts = datetime.utcnow().isoformat()
+    try:
+        records = [_progress_record(it, defaults, ts) for it in items]
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "error": "invalid_item"}), 400
+    if records:
+        with get_db() as conn:
+            progress_writer.write(conn, records)
+            conn.commit()
+    return jsonify({"success": True, "count": len(records)})
+
 @app.route("/progress", methods=["GET"])
 def progress_list():
     user_id = request.args.get("user_id") or ""
@@ -293,6 +377,7 @@ def delete_account():
     with get_db() as conn:
         conn.execute("DELETE FROM course_progress WHERE user_id = ? OR user_id = ?", (user_email, str(user_id)))
         conn.execute("DELETE FROM exam_submissions WHERE user_id = ? OR user_id = ?", (user_email, str(user_id)))
+        conn.execute("DELETE FROM user_topic_stats WHERE user_id = ? OR user_id = ?", (user_email, str(user_id)))
         conn.execute("DELETE FROM users WHERE id = ?", (user_id,))
         conn.commit()
     for key in [user_email, str(user_id)]:
@@ -303,10 +388,10 @@ def delete_account():
                     shutil.rmtree(folder)
                 except Exception:
                     pass
-    try:
-        proctor.train_model()
-    except Exception:
-        pass
+            try:
+                proctor.remove_user(key)
+            except Exception:
+                pass
     return jsonify({"success": True})
 
 if __name__ == '__main__':
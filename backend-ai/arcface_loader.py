@@ -0,0 +1,75 @@
+# backend-ai/arcface_loader.py
+# DeepFace/ArcFace dimuat malas di thread background: import deepface (TensorFlow) dan build_model makan waktu
+# lama, sementara endpoint non-wajah harus sudah bisa melayani sejak proses start.
+import os
+import threading
+import time
+
+
+class ArcFaceLoader:
+    """
+    state: "cold" (belum dimulai), "loading", "ready", atau "unavailable" (deepface tidak terpasang / gagal dimuat).
+    Pemanggil latensi-sensitif (identify) memakai get() yang tidak menunggu; training memakai wait().
+    """
+    def __init__(self):
+        self._reset()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        # Juga dipanggil di proses hasil fork (serve.py): TensorFlow tidak aman di-fork, setiap worker memuat sendiri
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self.DeepFace = None
+        self.model = None
+        self.state = "cold"
+        self.error = None
+        self.load_seconds = None
+
+    def start(self):
+        """Mulai memuat di background (idempoten, murah dipanggil di setiap request)."""
+        if self.state != "cold":
+            return
+        with self._lock:
+            if self.state != "cold":
+                return
+            self.state = "loading"
+        threading.Thread(target=self._load, name="arcface-loader", daemon=True).start()
+
+    def _load(self):
+        t0 = time.time()
+        try:
+            from deepface import DeepFace
+            self.model = DeepFace.build_model('ArcFace')
+            self.DeepFace = DeepFace
+            self.state = "ready"
+            self.load_seconds = round(time.time() - t0, 2)
+            print(f"[AI-PROCTOR] ArcFace model loaded in {self.load_seconds:.2f}s.")
+        except Exception as e:
+            self.DeepFace, self.model = None, None
+            self.state = "unavailable"
+            self.error = str(e)
+            print(f"[AI-PROCTOR] ArcFace unavailable ({e}); using LBPH only.")
+        finally:
+            self._done.set()
+
+    def disable(self):
+        """Paksa jalur tanpa ArcFace (LBPH saja), misalnya untuk baseline bench.py."""
+        with self._lock:
+            if self.state == "cold":
+                self.state = "unavailable"
+                self.error = "disabled"
+                self._done.set()
+
+    def get(self):
+        """(DeepFace, model) kalau sudah siap, selain itu (None, None) tanpa menunggu."""
+        self.start()
+        if self.state != "ready":
+            return None, None
+        return self.DeepFace, self.model
+
+    def wait(self, timeout: float = None):
+        """Seperti get(), tapi menunggu pemuatan selesai (dipakai training di thread background)."""
+        self.start()
+        self._done.wait(timeout)
+        return self.get()
@@ -0,0 +1,448 @@
+# backend-ai/bench.py
+# Benchmark offline pipeline wajah (enroll, train, verify, identify, scheduler) dan endpoint API berbasis SQLite,
+# dengan user dan submission sintetis. Semua state ditulis ke folder sementara (PROCTOR_DATA_DIR), bukan data asli.
+# Jalankan: python bench.py [--users 1000] [--subs 3] [--stages face,db,api] [--out bench.json] [--compare sebelumnya.json]
+import argparse
+import base64
+import importlib
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+
+
+class _PeakRSS:
+    """Sampling RSS proses ini (Linux /proc) selama satu stage; fallback ke ru_maxrss (puncak seumur proses)."""
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.peak = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def current_mb() -> float:
+        try:
+            with open("/proc/self/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) / 1024.0
+        except OSError:
+            pass
+        try:
+            import resource
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return rss / (1024.0 * 1024.0) if sys.platform == "darwin" else rss / 1024.0
+        except ImportError:
+            return 0.0
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.current_mb())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = self.current_mb()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.current_mb())
+
+
+def measure(name: str, fn, items: list, concurrency: int = 1, results: list = None, **extra) -> dict:
+    """
+    Jalankan fn(item) untuk setiap item (paralel kalau concurrency > 1) dan catat latensi per panggilan.
+    fn mengembalikan False (atau melempar exception) untuk panggilan yang gagal.
+    """
+    times = np.zeros(len(items))
+    errors = [0]
+
+    def call(i):
+        t0 = time.perf_counter()
+        try:
+            ok = fn(items[i])
+        except Exception as e:
+            ok = False
+            if errors[0] == 0:
+                print(f"[BENCH] {name}: {e}")
+        times[i] = (time.perf_counter() - t0) * 1000.0
+        if ok is False:
+            errors[0] += 1
+
+    with _PeakRSS() as rss:
+        t0 = time.perf_counter()
+        if concurrency > 1:
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                list(pool.map(call, range(len(items))))
+        else:
+            for i in range(len(items)):
+                call(i)
+        wall = time.perf_counter() - t0
+
+    r = {
+        "name": name,
+        "n": len(items),
+        "concurrency": concurrency,
+        "errors": errors[0],
+        "p50_ms": round(float(np.percentile(times, 50)), 3) if len(items) else 0.0,
+        "p95_ms": round(float(np.percentile(times, 95)), 3) if len(items) else 0.0,
+        "p99_ms": round(float(np.percentile(times, 99)), 3) if len(items) else 0.0,
+        "mean_ms": round(float(times.mean()), 3) if len(items) else 0.0,
+        "wall_s": round(wall, 3),
+        "throughput_per_s": round(len(items) / wall, 2) if wall > 0 else 0.0,
+        "peak_rss_mb": round(rss.peak, 1),
+    }
+    r.update(extra)
+    if "rows" in extra and wall > 0:
+        r["rows_per_s"] = round(extra["rows"] / wall, 1)  # stage bulk: satu panggilan, throughput yang berarti per baris
+    print(f"[BENCH] {name:<28} n={r['n']:<6} p50={r['p50_ms']:>9.2f} p95={r['p95_ms']:>9.2f} p99={r['p99_ms']:>9.2f} ms "
+          f"{r['throughput_per_s']:>10.1f}/s rss={r['peak_rss_mb']:>7.1f}MB err={r['errors']}")
+    if results is not None:
+        results.append(r)
+    return r
+
+
+# --- data sintetis -------------------------------------------------------------------------------------------------
+
+def dataset_crops(limit: int = 200) -> list:
+    from config import DATASET_DIR
+    crops = []
+    for root, _, files in sorted(os.walk(DATASET_DIR)):
+        for fn in sorted(files):
+            if fn.lower().endswith((".jpg", ".jpeg", ".png")):
+                img = cv2.imread(os.path.join(root, fn), cv2.IMREAD_GRAYSCALE)
+                if img is not None:
+                    crops.append(cv2.resize(img, (200, 200)))
+                if len(crops) >= limit:
+                    return crops
+    return crops
+
+
+def augment(rng: random.Random, crop, n: int) -> list:
+    """Variasi crop (geser, putar sedikit, kecerahan, flip) untuk membuat 'user' sintetis dari crop dataset."""
+    out = []
+    for _ in range(n):
+        m = cv2.getRotationMatrix2D((100, 100), rng.uniform(-8, 8), rng.uniform(0.92, 1.08))
+        m[:, 2] += (rng.uniform(-6, 6), rng.uniform(-6, 6))
+        img = cv2.warpAffine(crop, m, (200, 200), borderMode=cv2.BORDER_REFLECT)
+        img = cv2.convertScaleAbs(img, alpha=rng.uniform(0.85, 1.15), beta=rng.uniform(-15, 15))
+        out.append(cv2.flip(img, 1) if rng.random() < 0.5 else img)
+    return out
+
+
+def compose_scene(rng: random.Random, crops: list, faces: int, size=(640, 480)):
+    """Frame BGR berisi `faces` wajah tanpa tumpang tindih (slot kolom), di atas latar bernoise."""
+    W, H = size
+    bg = np.full((H, W), rng.randint(60, 190), np.uint8)
+    cv2.randn(bg, int(bg[0, 0]), 12)
+    slot = W // max(1, faces)
+    for k in range(faces):
+        side = rng.randint(int(min(slot, H) * 0.55), int(min(slot, H) * 0.9))
+        x = k * slot + rng.randint(0, slot - side)
+        y = rng.randint(0, H - side)
+        bg[y:y+side, x:x+side] = cv2.resize(rng.choice(crops), (side, side))
+    return cv2.cvtColor(bg, cv2.COLOR_GRAY2BGR)
+
+
+def jitter(rng: random.Random, frame):
+    """Frame berikutnya dari sesi yang sama: noise kamera saja (kandidat diam)."""
+    noise = np.zeros_like(frame)
+    cv2.randn(noise, 0, 3)
+    return cv2.add(frame, noise)
+
+
+def jpeg(img, quality: int = 80) -> bytes:
+    return cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes()
+
+
+def data_url(img_bytes: bytes) -> str:
+    return "data:image/jpeg;base64," + base64.b64encode(img_bytes).decode()
+
+
+def random_sheets(rng: np.random.Generator, n: int, exam) -> list:
+    """Lembar jawaban sintetis: tiap lembar punya peluang benar sendiri, jawaban salah diacak dari opsi 0..3."""
+    skill = rng.uniform(0.3, 0.95, size=(n, 1))
+    correct = rng.random((n, len(exam))) < skill
+    wrong = (exam.key[None, :] + rng.integers(1, 4, size=(n, len(exam)))) % 4
+    ans = np.where(correct, exam.key[None, :], wrong)
+    return [[str(int(a)) for a in row] for row in ans]
+
+
+# --- stage ---------------------------------------------------------------------------------------------------------
+
+def bench_face(args, results: list):
+    from app import proctor
+    from frame_scheduler import FrameScheduler
+
+    rng = random.Random(args.seed)
+    base = dataset_crops()
+    if not base:
+        print("[BENCH] dataset/ is empty; skipping face stage.")
+        return
+    face_users = [f"bench-face-{i}" for i in range(args.face_users)]
+    for uid in face_users:
+        proctor.face_store.append(uid, augment(rng, rng.choice(base), args.crops_per_user))
+
+    frames = [jpeg(compose_scene(rng, base, 1 + (i % args.max_faces))) for i in range(args.frames)]
+    singles = [jpeg(compose_scene(rng, base, 1)) for _ in range(min(args.frames, 100))]
+
+    measure("face.enroll_image", lambda f: proctor.extract_faces(f"bench-enroll-{rng.randrange(10**9)}", data_url(f)) > 0,
+            singles, results=results)
+    users = len(proctor.face_store.users())
+    measure("face.train_model", lambda _: proctor.train_model(), [None] * args.train_repeats, results=results,
+            users=users, crops=sum(proctor.face_store.count(u) for u in proctor.face_store.users()))
+
+    def incremental(uid):
+        proctor.face_store.append(uid, augment(rng, rng.choice(base), 10))
+        return proctor.train_incremental(uid)
+    measure("face.train_incremental", incremental, face_users[:20], results=results, users=users)
+
+    # Matcher LBPH: verify 1:1 dan identify 1:N atas model segmen vs predict() OpenCV atas crop yang sama
+    crops, labels = [], []
+    for uid in proctor.face_store.users():
+        if uid in proctor.label_map:
+            crops += [np.array(c) for c in proctor.face_store.load(uid)]
+            labels += [proctor.label_map[uid]] * proctor.face_store.count(uid)
+    lbph = proctor._new_recognizer()
+    lbph.train(crops, np.array(labels, dtype=np.int32))
+    probes = [(proctor.label_map[uid], probe) for uid in face_users if uid in proctor.label_map
+              for probe in augment(rng, proctor.face_store.load(uid)[0], 5)]
+    measure("face.lbph_predict", lambda it: lbph.predict(it[1])[0] == it[0], probes, results=results, histograms=len(crops))
+    measure("face.lbph_verify", lambda it: proctor.verifier.verify(it[1], it[0], 65.0)[0], probes,
+            results=results, histograms=len(crops))
+    measure("face.lbph_identify", lambda it: proctor.verifier.identify(it[1], 65.0)[0] == it[0], probes,
+            results=results, histograms=len(crops))
+
+    # Sesi baru per frame: selalu deteksi Haar penuh (worst case awal ujian)
+    measure("face.verify_cold", lambda i: "status" in proctor.verify_bytes(frames[i], f"bench-cold-{i}"),
+            list(range(len(frames))), results=results)
+
+    # Sesi berjalan: user ter-enroll di depan kamera dengan noise kamera saja -> status "safe", tracking + dedup frame
+    enrolled = [uid for uid in face_users if uid in proctor.label_map][:args.sessions]
+    sessions = [(uid, compose_scene(rng, [np.array(proctor.face_store.load(uid)[0])], 1)) for uid in enrolled]
+    seq = [(uid, jpeg(jitter(rng, img))) for _ in range(max(1, args.frames // max(1, len(sessions))))
+           for uid, img in sessions]
+    counts = {"cached": 0, "safe": 0}
+
+    def steady(item):
+        res = proctor.verify_bytes(item[1], item[0])
+        counts["cached"] += 1 if res.get("cached") else 0
+        counts["safe"] += 1 if res.get("status") == "safe" else 0
+        return "status" in res
+    r = measure("face.verify_session", steady, seq, results=results, sessions=len(sessions))
+    r["cached_ratio"] = round(counts["cached"] / float(max(1, len(seq))), 3)
+    r["safe_ratio"] = round(counts["safe"] / float(max(1, len(seq))), 3)
+    if r["cached_ratio"] == 0:
+        print("[BENCH] face.verify_session: no frame was served from the dedup cache; steady-state path not exercised.")
+
+    measure("face.identify", lambda f: "success" in proctor.identify(data_url(f)), singles, results=results,
+            arcface=proctor.arcface.state)
+
+    # Lonjakan: banyak sesi mengirim frame bersamaan; scheduler membagikannya terus-menerus ke worker kosong
+    scheduler = FrameScheduler(proctor)
+    burst = [(f"bench-burst-{i}", frames[i % len(frames)]) for i in range(args.frames * 2)]
+    r = measure("face.scheduler_burst", lambda it: "status" in scheduler.submit(it[0], it[1]), burst,
+                concurrency=args.concurrency, results=results)
+    r["scheduler"] = scheduler.stats()
+
+
+def bench_db(args, results: list):
+    from werkzeug.security import generate_password_hash
+    from cohort_analysis import reanalyze_all
+    from config import DB_PATH
+    from db import get_db
+    from dss_engine import rebuild_topic_stats
+    from exams import get_exam, rescore_submissions
+
+    conn = get_db()
+    exam = get_exam()
+    rng = np.random.default_rng(args.seed)
+    ph = generate_password_hash("bench-password")
+    emails = [f"user{i}@bench.local" for i in range(args.users)]
+    chunk = 10000
+
+    def seed_users(_):
+        with conn:
+            for i in range(0, len(emails), chunk):
+                conn.executemany(
+                    "INSERT OR IGNORE INTO users (name, email, password_hash, created_at) VALUES (?, ?, ?, ?)",
+                    [(f"User {j}", e, ph, "2026-01-01T00:00:00") for j, e in enumerate(emails[i:i + chunk], i)],
+                )
+    measure("db.seed_users", seed_users, [None], results=results, rows=len(emails))
+
+    total = args.users * args.subs
+
+    def seed_submissions(_):
+        with conn:
+            for i in range(0, total, chunk):
+                n = min(chunk, total - i)
+                sheets = random_sheets(rng, n, exam)
+                res = exam.score_batch(sheets)
+                conn.executemany(
+                    "INSERT INTO exam_submissions (user_id, exam_id, answers, score, total, percentage, package, weak_areas, recommendations, total_study_hours, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, '[]', '[]', 0, ?)",
+                    [(emails[(i + k) % len(emails)], exam.exam_id, json.dumps(s), int(sc), res["total"], float(p),
+                      "Pro Learning Path", "2026-01-01T00:00:00")
+                     for k, (s, sc, p) in enumerate(zip(sheets, res["score"], res["percentage"]))],
+                )
+    measure("db.seed_submissions", seed_submissions, [None], results=results, rows=total)
+    measure("db.rebuild_topic_stats", lambda _: rebuild_topic_stats(conn), [None], results=results, rows=total)
+    measure("db.rescore_submissions", lambda _: rescore_submissions(conn) == total, [None], results=results, rows=total)
+    measure("db.cohort_reanalyze", lambda _: reanalyze_all(DB_PATH, workers=args.workers) == total, [None],
+            results=results, rows=total, workers=args.workers)
+
+
+def bench_api(args, results: list):
+    from app import app, progress_writer
+    from config import DB_PATH
+    from db import get_db
+    from exams import get_exam
+
+    if get_db().execute("SELECT COUNT(*) FROM users").fetchone()[0] == 0:
+        print("[BENCH] No synthetic users (db stage not run); seeding 100 users for the api stage.")
+        args.users, args.subs = min(args.users, 100), 1
+        bench_db(args, [])
+    rng = random.Random(args.seed)
+    nrng = np.random.default_rng(args.seed)
+    exam = get_exam()
+    n = args.requests
+    emails = [f"user{rng.randrange(args.users)}@bench.local" for _ in range(n)]
+    ids = [int(i) for i in nrng.integers(1, args.users + 1, size=n)]
+    sheets = random_sheets(nrng, n, exam)
+    base = dataset_crops()
+    frames = [data_url(jpeg(compose_scene(rng, base, 1 + i % 2))) for i in range(min(n, 100))] if base else []
+    local = threading.local()
+
+    def client():
+        c = getattr(local, "client", None)
+        if c is None:
+            c = local.client = app.test_client()
+        return c
+
+    def ok(resp, *allowed):
+        return resp.status_code < 400 or resp.status_code in allowed
+
+    endpoints = [
+        ("GET /ready", lambda i: ok(client().get("/ready"))),
+        # check_password_hash (scrypt) sengaja mahal; angka ini batas atas login per core
+        ("POST /login", lambda i: ok(client().post("/login", json={"email": emails[i], "password": "bench-password"}))),
+        ("GET /user", lambda i: ok(client().get(f"/user?id={ids[i]}"))),
+        ("POST /submit-exam", lambda i: ok(client().post("/submit-exam", json={
+            "user_id": emails[i], "answers": sheets[i], "package": "pro", "exam_id": exam.exam_id}))),
+        ("GET /submissions", lambda i: ok(client().get(f"/submissions?user_id={emails[i]}&limit=20"))),
+        ("POST /progress/update", lambda i: ok(client().post("/progress/update", json={
+            "user_id": emails[i], "module_title": "Python Basics", "lesson_index": i % 12,
+            "lesson_title": f"Lesson {i % 12}", "completed": False, "last_position": float(i)}))),
+        ("POST /progress/batch", lambda i: ok(client().post("/progress/batch", json={
+            "user_id": emails[i], "module_title": "Databases (SQL)",
+            "items": [{"lesson_index": k, "lesson_title": f"Lesson {k}", "completed": True} for k in range(10)]}))),
+        ("GET /progress", lambda i: ok(client().get(f"/progress?user_id={emails[i]}"))),
+    ]
+    if frames:
+        endpoints += [
+            ("POST /verify", lambda i: ok(client().post("/verify", json={
+                "user_id": f"bench-api-{i % 50}", "image": frames[i % len(frames)], "preview": False}), 503)),
+            ("POST /login-face", lambda i: ok(client().post("/login-face", json={"image": frames[i % len(frames)]}), 401, 404)),
+        ]
+    for name, fn in endpoints:
+        measure(f"api.{name}", fn, list(range(n)), concurrency=args.concurrency, results=results, db=os.path.basename(DB_PATH))
+    progress_writer.flush()
+
+
+# --- laporan -------------------------------------------------------------------------------------------------------
+
+def metadata(args) -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except Exception:
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "args": vars(args),
+    }
+
+
+def compare(old: dict, new: dict):
+    """Tabel perbandingan p95 dan throughput per stage terhadap hasil run sebelumnya."""
+    before = {r["name"]: r for r in old.get("results", [])}
+    print(f"\n{'stage':<30} {'p95 old':>10} {'p95 new':>10} {'delta':>8} {'thr old':>10} {'thr new':>10}")
+    for r in new["results"]:
+        o = before.get(r["name"])
+        if o is None:
+            continue
+        delta = (r["p95_ms"] - o["p95_ms"]) / o["p95_ms"] * 100.0 if o["p95_ms"] else 0.0
+        print(f"{r['name']:<30} {o['p95_ms']:>10.2f} {r['p95_ms']:>10.2f} {delta:>+7.1f}% "
+              f"{o['throughput_per_s']:>10.1f} {r['throughput_per_s']:>10.1f}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark offline pipeline wajah dan endpoint API.")
+    ap.add_argument("--stages", default="face,db,api", help="subset dari face,db,api")
+    ap.add_argument("--users", type=int, default=1000, help="jumlah user sintetis di database (1k-100k)")
+    ap.add_argument("--subs", type=int, default=3, help="submission sintetis per user")
+    ap.add_argument("--face-users", type=int, default=20, help="user wajah sintetis (augmentasi crop dataset/)")
+    ap.add_argument("--crops-per-user", type=int, default=30)
+    ap.add_argument("--frames", type=int, default=200, help="frame sintetis untuk verify/scheduler")
+    ap.add_argument("--max-faces", type=int, default=3, help="wajah maksimum per frame sintetis")
+    ap.add_argument("--sessions", type=int, default=20, help="sesi ujian paralel untuk face.verify_session")
+    ap.add_argument("--train-repeats", type=int, default=3)
+    ap.add_argument("--requests", type=int, default=300, help="request per endpoint API")
+    ap.add_argument("--concurrency", type=int, default=1, help="thread klien paralel untuk API dan scheduler")
+    ap.add_argument("--workers", type=int, default=0, help="process pool cohort_analysis (0 = tanpa pool, RSS akurat)")
+    ap.add_argument("--arcface", action="store_true", help="muat ArcFace kalau deepface terpasang (default: baseline LBPH)")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--data-dir", default=None, help="folder state (default: folder sementara yang dihapus di akhir)")
+    ap.add_argument("--out", default=None, help="tulis hasil JSON ke file ini")
+    ap.add_argument("--compare", default=None, help="JSON hasil run sebelumnya untuk dibandingkan")
+    args = ap.parse_args()
+
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="proctor-bench-")
+    os.makedirs(data_dir, exist_ok=True)
+    # Harus di-set sebelum config diimpor: semua path state mengikuti PROCTOR_DATA_DIR
+    os.environ["PROCTOR_DATA_DIR"] = data_dir
+    try:
+        results = []
+        # Waktu sampai endpoint non-wajah bisa melayani: import app = migrasi DB, cascade, model, DSS
+        measure("startup.import_app", lambda _: importlib.import_module("app") is not None, [None], results=results)
+        app = sys.modules["app"]
+        if not args.arcface:
+            app.proctor.arcface.disable()
+        stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+        for stage, fn in (("face", bench_face), ("db", bench_db), ("api", bench_api)):
+            if stage in stages:
+                fn(args, results)
+        report = {"meta": metadata(args), "results": results}
+        report["meta"]["arcface"] = app.proctor.arcface.state
+        if args.out:
+            with open(args.out, "w") as f:
+                json.dump(report, f, indent=2)
+            print(f"[BENCH] Results written to {args.out}.")
+        if args.compare:
+            with open(args.compare) as f:
+                compare(json.load(f), report)
+    finally:
+        if not args.data_dir:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# backend-ai/bench_detect.py
+# Benchmark trade-off akurasi/latensi deteksi Haar terhadap DETECT_WIDTH.
+# Jalankan: python bench_detect.py [--frames 200] [--size 640x480] [--widths 0,480,320,240,160]
+import argparse
+import glob
+import os
+import random
+import time
+import cv2
+import numpy as np
+from config import DATASET_DIR
+from recognizer import FaceProctor
+
+
+def compose_frames(n: int, size=(640, 480), seed: int = 7):
+    """Tempel crop wajah dari dataset/ ke latar berukuran size dengan posisi dan ukuran acak. Mengembalikan (gray, bbox_asli)."""
+    rng = random.Random(seed)
+    paths = sorted(glob.glob(os.path.join(DATASET_DIR, "*", "*.jpg")))
+    W, H = size
+    frames = []
+    for _ in range(n):
+        crop = cv2.imread(rng.choice(paths), cv2.IMREAD_GRAYSCALE)
+        side = rng.randint(int(H * 0.3), int(H * 0.6))
+        crop = cv2.resize(crop, (side, side))
+        bg = np.full((H, W), rng.randint(60, 190), np.uint8)
+        cv2.randn(bg, int(bg[0, 0]), 12)
+        x, y = rng.randint(0, W - side), rng.randint(0, H - side)
+        bg[y:y+side, x:x+side] = crop
+        frames.append((bg, (x, y, side, side)))
+    return frames
+
+
+def iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = ix * iy
+    return inter / float(aw * ah + bw * bh - inter)
+
+
+def run(proctor: FaceProctor, frames, width: int):
+    proctor.detect_width = width
+    hits = 0
+    false_pos = 0
+    times = []
+    for gray, truth in frames:
+        t0 = time.perf_counter()
+        faces = proctor._detect(gray, 100)
+        times.append((time.perf_counter() - t0) * 1000.0)
+        matched = [f for f in faces if iou(f, truth) >= 0.5]
+        hits += 1 if matched else 0
+        false_pos += len(faces) - len(matched)
+    times = np.array(times)
+    return {
+        "width": width or "full",
+        "recall": hits / float(len(frames)),
+        "false_pos": false_pos,
+        "p50_ms": float(np.percentile(times, 50)),
+        "p95_ms": float(np.percentile(times, 95)),
+    }
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--frames", type=int, default=200)
+    ap.add_argument("--size", default="640x480")
+    ap.add_argument("--widths", default="0,480,320,240,160")
+    args = ap.parse_args()
+
+    proctor = FaceProctor()
+    frames = compose_frames(args.frames, tuple(int(v) for v in args.size.split("x")))
+    print(f"{'width':>6} {'recall':>7} {'false+':>7} {'p50 ms':>8} {'p95 ms':>8}")
+    for w in [int(v) for v in args.widths.split(",")]:
+        r = run(proctor, frames, w)
+        print(f"{r['width']:>6} {r['recall']:>7.3f} {r['false_pos']:>7} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f}")
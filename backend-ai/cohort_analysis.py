@@ -0,0 +1,179 @@
+# backend-ai/cohort_analysis.py
+# Analisis ulang rekomendasi DSS untuk semua submission, misalnya setelah packages, group_course_map atau alpha diubah.
+# Jalankan: python cohort_analysis.py [--db PATH] [--chunk 50000] [--workers N] [--alpha 0.6]
+import argparse
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from config import DB_PATH, DEFAULT_EXAM_ID, DSS_HISTORY_DECAY
+from db import get_db
+from dss_engine import LearningPathDSS
+from exams import load_exams
+from migrations import migrate
+
+_worker = None
+
+
+def _init_worker(alpha: float = None):
+    global _worker
+    dss = LearningPathDSS()
+    if alpha is not None:
+        dss.alpha = alpha
+    exams = load_exams()
+    topics = list(dict.fromkeys(t for e in exams.values() for t in e.topics))
+    packages = {p["name"]: key for key, p in dss.packages.items()}
+    _worker = (dss, exams, topics, packages)
+
+
+def topic_rates(rows: list, exams: dict, topics: list):
+    """
+    rows: [(id, user_id, exam_id, answers_json, package)] urut per user lalu id, berisi seluruh riwayat tiap user.
+    Mengembalikan (current, hist, totals), masing-masing (n x T) atas daftar `topics`:
+    tingkat salah ujian itu sendiri, tingkat salah riwayat (terluruh) sebelum submission itu, dan jumlah soal per topik.
+    Sama dengan yang dilihat analyze_performance saat submit, tapi dihitung vektor untuk semua user sekaligus.
+    """
+    n, t = len(rows), len(topics)
+    wrong = np.zeros((n, t))
+    total = np.zeros((n, t))
+    complete = np.zeros(n, dtype=bool)
+    by_exam = {}
+    for i, r in enumerate(rows):
+        try:
+            answers = json.loads(r[3]) if r[3] else []
+        except Exception:
+            answers = []
+        by_exam.setdefault(r[2] or DEFAULT_EXAM_ID, []).append((i, answers))
+    for exam_id, items in by_exam.items():
+        exam = exams.get(exam_id)
+        if exam is None:
+            continue
+        idx = np.array([i for i, _ in items])
+        cols = [topics.index(tp) for tp in exam.topics]
+        _, tw = exam.grade(exam.encode([a for _, a in items]))
+        wrong[np.ix_(idx, cols)] = tw
+        total[np.ix_(idx, cols)] = exam.topic_totals
+        complete[idx] = [len(a) == len(exam) for _, a in items]
+
+    # Riwayat hanya menghitung (dan hanya diluruhkan oleh) lembar lengkap. State per user diperbarui posisi demi posisi;
+    # setiap langkah memproses submission ke-j milik semua user sekaligus.
+    users = np.array([r[1] for r in rows], dtype=object)
+    first = np.r_[True, users[1:] != users[:-1]] if n else np.zeros(0, dtype=bool)
+    group = np.cumsum(first) - 1
+    pos = np.arange(n) - np.flatnonzero(first)[group]
+    state_w = np.zeros((int(first.sum()), t))
+    state_t = np.zeros_like(state_w)
+    hist_w, hist_t = np.zeros((n, t)), np.zeros((n, t))
+    order = np.argsort(pos, kind="stable")
+    bounds = np.searchsorted(pos[order], np.arange(int(pos.max()) + 2)) if n else [0]
+    for j in range(len(bounds) - 1):
+        idx = order[bounds[j]:bounds[j + 1]]
+        g = group[idx]
+        hist_w[idx], hist_t[idx] = state_w[g], state_t[g]
+        idx, g = idx[complete[idx]], g[complete[idx]]
+        state_w[g] = state_w[g] * DSS_HISTORY_DECAY + wrong[idx]
+        state_t[g] = state_t[g] * DSS_HISTORY_DECAY + total[idx]
+
+    current = np.divide(wrong, total, out=np.zeros_like(wrong), where=total > 0)
+    hist = np.divide(hist_w, hist_t, out=np.zeros_like(hist_w), where=hist_t > 0)
+    return current, hist, total
+
+
+def _analyze_chunk(rows: list) -> list:
+    """Di worker: hitung ulang rekomendasi untuk satu chunk (berisi user utuh). Mengembalikan baris UPDATE."""
+    dss, exams, topics, packages = _worker
+    current, hist, total = topic_rates(rows, exams, topics)
+    out = []
+    for i, r in enumerate(rows):
+        exam = exams.get(r[2] or DEFAULT_EXAM_ID)
+        if exam is None:
+            continue
+        cols = [topics.index(tp) for tp in exam.topics]
+        blended = {tp: dss.alpha * current[i, c] + (1 - dss.alpha) * hist[i, c] for tp, c in zip(exam.topics, cols)}
+        counts = {tp: int(total[i, c]) for tp, c in zip(exam.topics, cols)}
+        package = packages.get(r[4], "pro")
+        recs, hours = dss.recommend(blended, counts, package)
+        out.append((
+            dss.packages[package]["name"],
+            json.dumps([x["topic"] for x in recs]),
+            json.dumps(recs),
+            hours,
+            r[0],
+        ))
+    return out
+
+
+def _user_chunks(cur, chunk: int):
+    """Chunk baris berurutan per user; baris user terakhir ditahan ke chunk berikutnya supaya riwayatnya tidak terpotong."""
+    pending = []
+    while True:
+        rows = cur.fetchmany(chunk)
+        if not rows:
+            if pending:
+                yield pending
+            return
+        rows = pending + rows
+        cut = len(rows)
+        while cut > 0 and rows[cut - 1][1] == rows[-1][1]:
+            cut -= 1
+        if cut == 0:
+            pending = rows
+            continue
+        yield rows[:cut]
+        pending = rows[cut:]
+
+
+def reanalyze_all(db_path: str = DB_PATH, chunk: int = 50000, workers: int = None, alpha: float = None) -> int:
+    """
+    Hitung ulang weak_areas/recommendations/total_study_hours semua submission dengan konfigurasi DSS saat ini.
+    Submission dibaca bertahap lewat koneksi baca terpisah (snapshot WAL), dianalisis paralel di process pool,
+    dan ditulis balik per chunk dengan executemany dalam satu transaksi. workers=0 = tanpa pool.
+    Mengembalikan jumlah submission yang diperbarui.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    conn = get_db(db_path)
+    migrate(conn)
+    reader = sqlite3.connect(db_path)
+    cur = reader.execute("SELECT id, user_id, exam_id, answers, package FROM exam_submissions ORDER BY user_id, id")
+    done, t0 = 0, time.time()
+
+    def write(updates):
+        nonlocal done
+        with conn:
+            conn.executemany(
+                "UPDATE exam_submissions SET package = ?, weak_areas = ?, recommendations = ?, total_study_hours = ? WHERE id = ?",
+                updates,
+            )
+        done += len(updates)
+        print(f"[DSS] Re-analyzed {done} submission(s) ({done / max(time.time() - t0, 1e-6):.0f}/s).")
+
+    try:
+        if workers <= 0:
+            _init_worker(alpha)
+            for rows in _user_chunks(cur, chunk):
+                write(_analyze_chunk(rows))
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(alpha,)) as pool:
+                inflight = []
+                for rows in _user_chunks(cur, chunk):
+                    inflight.append(pool.submit(_analyze_chunk, rows))
+                    if len(inflight) >= workers * 2:
+                        write(inflight.pop(0).result())
+                for fut in inflight:
+                    write(fut.result())
+    finally:
+        reader.close()
+    return done
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--db", default=DB_PATH)
+    ap.add_argument("--chunk", type=int, default=50000)
+    ap.add_argument("--workers", type=int, default=None, help="jumlah proses (default: jumlah CPU, 0 = tanpa pool)")
+    ap.add_argument("--alpha", type=float, default=None, help="bobot ujian sekarang vs riwayat (default: LearningPathDSS.alpha)")
+    args = ap.parse_args()
+    print(f"{reanalyze_all(args.db, args.chunk, args.workers, args.alpha)} submission(s) updated.")
@@ -2,8 +2,91 @@
 import os
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DATASET_DIR = os.path.join(BASE_DIR, "dataset")
+# State yang ditulis backend (faces, model, label, embedding, database); bench.py mengarahkannya ke folder sementara
+DATA_DIR = os.environ.get("PROCTOR_DATA_DIR") or BASE_DIR
+DATASET_DIR = os.path.join(BASE_DIR, "dataset")  # folder JPEG lama, dimigrasi ke FACES_DIR
+FACES_DIR = os.path.join(DATA_DIR, "faces")
 HAAR_FACE = os.path.join(BASE_DIR, "haarcascade_frontalface_default.xml")
 HAAR_EYE = os.path.join(BASE_DIR, "haarcascade_eye.xml")
-TRAINING_MODEL = os.path.join(BASE_DIR, "training.xml")
-DB_PATH = os.path.join(BASE_DIR, "database.sqlite3")
+TRAINING_MODEL = os.path.join(DATA_DIR, "training.xml")  # format lama, hanya dibaca untuk migrasi ke MODEL_DIR
+MODEL_DIR = os.path.join(DATA_DIR, "model")
+TRAIN_JOBS_DIR = os.path.join(MODEL_DIR, "jobs")  # status job training, dibagi antar worker serve.py
+TRAIN_JOB_TTL = 24 * 3600  # file status job lebih tua dari ini (detik) dibuang saat startup / setelah job selesai
+LABELS_PATH = os.path.join(DATA_DIR, "labels.json")
+EMBEDDINGS_DIR = os.path.join(DATA_DIR, "embeddings")
+DB_PATH = os.path.join(DATA_DIR, "database.sqlite3")
+EXAMS_PATH = os.path.join(BASE_DIR, "exams.json")
+DEFAULT_EXAM_ID = "se-final-v1"  # submission tanpa exam_id dinilai dengan ujian ini
+
+# Proctoring tracker: deteksi Haar penuh tiap N frame, sisanya dicari di sekitar bbox sebelumnya
+TRACK_DETECT_EVERY = 5
+TRACK_MARGIN = 0.5
+# ...dan paling lambat tiap TRACK_FULL_DETECT_MS milidetik, berapapun jarak antar frame (wajah baru di luar jendela)
+TRACK_FULL_DETECT_MS = 600
+
+# Sesi proctoring tanpa frame selama SESSION_TTL detik dibuang (frame terakhir + tracker); paling banyak SESSION_MAX sesi
+SESSION_TTL = 120
+SESSION_MAX = 5000
+
+# Token reviewer untuk /proctor/preview (header X-Reviewer-Token); kosong = endpoint preview dimatikan
+REVIEWER_TOKEN = os.environ.get("PROCTOR_REVIEWER_TOKEN", "")
+# Lebar thumbnail preview yang diizinkan (piksel)
+PREVIEW_MIN_WIDTH = 64
+PREVIEW_MAX_WIDTH = 1280
+
+# Dedup frame per sesi: kalau tiap sel thumbnail 16x16 berselisih <= FRAME_DEDUP_THRESHOLD level abu-abu dari frame
+# sebelumnya, hasilnya dipakai ulang tanpa deteksi, paling banyak FRAME_DEDUP_MAX_REUSE kali berturut-turut
+FRAME_DEDUP_THRESHOLD = 8
+FRAME_DEDUP_MAX_REUSE = 5
+
+# Interval polling proctoring yang disarankan server (next_interval_ms): POLL_MIN_MS saat intruder/wajah hilang,
+# bertambah POLL_STEP_MS per frame "safe" berturut-turut sampai POLL_MAX_MS, dan diperpanjang saat antrean server padat
+POLL_MIN_MS = 120
+POLL_STEP_MS = 40
+POLL_MAX_MS = 1000
+
+# Lebar frame (px) tempat Haar cascade dijalankan; bbox dipetakan balik ke resolusi asli. 0 = resolusi penuh
+DETECT_WIDTH = 320
+
+# Indeks ArcFace: di atas IVF_THRESHOLD user, pencarian hanya memeriksa IVF_NPROBE cluster terdekat
+IVF_THRESHOLD = 20000
+IVF_NPROBE = 8
+
+# Ukuran batch forward ArcFace saat training
+EMBED_BATCH_SIZE = 32
+
+# Enroll: jumlah worker deteksi wajah, dan selisih rata-rata piksel thumbnail 16x16 di bawah ini dianggap frame duplikat
+ENROLL_WORKERS = 4
+ENROLL_DEDUP_THRESHOLD = 3.0
+
+# Verifikasi 1:1: jumlah prototipe user lain (paling mirip) yang dipakai sebagai kohort impostor, 0 = tanpa kohort
+VERIFY_COHORT_SIZE = 5
+
+# Setiap request verify/identify paling sering sekali per MODEL_RELOAD_INTERVAL detik mengecek meta.json
+# untuk generasi model baru (label map ikut generasi itu)
+MODEL_RELOAD_INTERVAL = 1.0
+
+# Enroll inkremental menambah satu segmen model; di atas MODEL_MAX_SEGMENTS segmen, segmen terkecil digabung
+MODEL_MAX_SEGMENTS = 32
+# Sama untuk cache embedding per gambar: di atas batas ini flush menulis ulang semua embedding menjadi satu segmen
+EMBEDDINGS_MAX_SEGMENTS = 32
+
+# SQLite: pool koneksi per proses (db.py) dengan paling banyak DB_POOL_SIZE koneksi menganggur, lama menunggu lock
+# sebelum "database is locked", dan ukuran cache prepared statement per koneksi
+DB_POOL_SIZE = 16
+DB_BUSY_TIMEOUT_MS = 5000
+DB_CACHED_STATEMENTS = 256
+
+# DSS: bobot riwayat per submission untuk statistik topik per user (0.98 ~ jendela efektif 50 submission terakhir)
+DSS_HISTORY_DECAY = 0.98
+
+# Progress kursus: update posisi video digabung per (user, modul, lesson) dan ditulis tiap N detik; batas item /progress/batch
+PROGRESS_FLUSH_INTERVAL = 1.0
+PROGRESS_BATCH_MAX = 500
+
+# Scheduler frame proctoring: frame dari banyak sesi diverifikasi paralel di SCHED_WORKERS thread (satu frame in-flight
+# per sesi); frame yang antre lebih dari SCHED_LATENCY_BUDGET_MS dibuang, dan di atas SCHED_MAX_QUEUE sesi antre
+# request baru langsung ditolak (503 + Retry-After)
+SCHED_LATENCY_BUDGET_MS = 400
+SCHED_MAX_QUEUE = 512
+SCHED_WORKERS = 4
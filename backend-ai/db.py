@@ -0,0 +1,103 @@
+# backend-ai/db.py
+# Pool koneksi SQLite per proses, dipakai bersama oleh app.py, dss_engine.py dan progress_writer.py.
+# Request Flask meminjam satu koneksi dari pool dan mengembalikannya di teardown_appcontext (server werkzeug
+# threaded membuat thread baru per request, jadi koneksi per thread tidak pernah terpakai ulang).
+# Thread background yang berumur panjang (flush progress, CLI) memakai koneksi milik thread-nya sendiri.
+import os
+import sqlite3
+import threading
+from flask import g, has_app_context
+from config import DB_PATH, DB_POOL_SIZE, DB_BUSY_TIMEOUT_MS, DB_CACHED_STATEMENTS
+
+_lock = threading.Lock()
+_idle = {}  # (pid, path) -> [koneksi menganggur]
+_local = threading.local()
+
+
+def _connect(path: str):
+    # check_same_thread=False: koneksi berpindah thread lewat pool, tapi hanya dipakai satu peminjam sekaligus
+    conn = sqlite3.connect(path, timeout=DB_BUSY_TIMEOUT_MS / 1000.0, cached_statements=DB_CACHED_STATEMENTS,
+                           check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    # WAL: pembaca tidak memblokir penulis; synchronous=NORMAL cukup aman di WAL dan jauh lebih sedikit fsync
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={int(DB_BUSY_TIMEOUT_MS)}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+
+def acquire(path: str = DB_PATH):
+    """Pinjam koneksi dari pool proses ini (dibuat baru kalau pool kosong). Kembalikan dengan release()."""
+    with _lock:
+        idle = _idle.get((os.getpid(), path))
+        if idle:
+            return idle.pop()
+    return _connect(path)
+
+
+def release(conn, path: str = DB_PATH):
+    """Kembalikan koneksi ke pool; transaksi yang belum di-commit dibatalkan. Di atas DB_POOL_SIZE, koneksi ditutup."""
+    try:
+        if conn.in_transaction:
+            conn.rollback()
+    except sqlite3.Error:
+        conn.close()
+        return
+    with _lock:
+        idle = _idle.setdefault((os.getpid(), path), [])
+        if len(idle) < DB_POOL_SIZE:
+            idle.append(conn)
+            return
+    conn.close()
+
+
+def get_db(path: str = DB_PATH):
+    """
+    Di dalam request: koneksi pinjaman request ini (sekali pinjam per path, dikembalikan oleh release_request).
+    Di luar request: koneksi milik thread ini, dicatat per PID supaya worker hasil fork tidak memakai koneksi induk.
+    Tetap bisa dipakai sebagai `with get_db() as conn:` — blok with hanya commit/rollback, tidak menutup koneksi.
+    """
+    if has_app_context():
+        conns = g.setdefault("_db_conns", {})
+        conn = conns.get(path)
+        if conn is None:
+            conn = conns[path] = acquire(path)
+        return conn
+    pool = getattr(_local, "pool", None)
+    if pool is None or pool[0] != os.getpid():
+        pool = (os.getpid(), {})
+        _local.pool = pool
+    conn = pool[1].get(path)
+    if conn is None:
+        conn = pool[1][path] = _connect(path)
+    return conn
+
+
+def release_request(exc=None):
+    """Handler teardown_appcontext: kembalikan koneksi pinjaman request ke pool."""
+    for path, conn in g.pop("_db_conns", {}).items():
+        release(conn, path)
+
+
+def init_app(app):
+    app.teardown_appcontext(release_request)
+
+
+def close_db():
+    """Tutup koneksi thread ini dan koneksi menganggur di pool (misalnya sebelum file database dihapus/diganti)."""
+    pool = getattr(_local, "pool", None)
+    if pool is not None and pool[0] == os.getpid():
+        for conn in pool[1].values():
+            try:
+                conn.close()
+            except Exception:
+                pass
+    _local.pool = None
+    with _lock:
+        for key in [k for k in _idle if k[0] == os.getpid()]:
+            for conn in _idle.pop(key):
+                try:
+                    conn.close()
+                except Exception:
+                    pass
@@ -1,11 +1,13 @@
 # backend-ai/dss_engine.py
 # Decision Support System – Personalized Learning Recommendation Engine
-import math
-import sqlite3
 import json
-from config import DB_PATH
-import pandas as pd
+import math
 from urllib.parse import quote
+import numpy as np
+from config import DSS_HISTORY_DECAY, DEFAULT_EXAM_ID
+from db import get_db
+from exams import get_exam, load_exams
+
 
 class LearningPathDSS:
     def __init__(self):
@@ -27,38 +29,15 @@ class LearningPathDSS:
             }
         }
 
-        # Mapping soal ke topik (Software Engineer Final Exam)
-        self.topic_map = {
-            0: "Python Basics",
-            1: "Python Basics",
-            2: "Data Structures (DSA)",
-            3: "Data Structures (DSA)",
-            4: "Data Structures (DSA)",
-            5: "Web Basics (HTML/CSS)",
-            6: "Web Basics (HTML/CSS)",
-            7: "Web Basics (HTML/CSS)",
-            8: "React.js Framework",
-            9: "React.js Framework",
-            10: "Backend (Node.js)",
-            11: "Backend (Node.js)",
-            12: "Backend (Node.js)",
-            13: "Databases (SQL)",
-            14: "Databases (SQL)",
-            15: "Databases (SQL)",
-            16: "Python Basics",
-            17: "Backend (Node.js)",
-            18: "React.js Framework",
-            19: "Data Structures (DSA)",
-        }
+        # Mapping soal ke topik dari definisi ujian default (exams.json)
+        exam = get_exam()
+        self.topic_map = exam.topic_map()
+        self.topic_groups = exam.topic_groups()
 
-        self.topic_groups = {
-            "Python Basics": [0, 1, 16],
-            "Web Basics (HTML/CSS)": [5, 6, 7],
-            "React.js Framework": [8, 9, 18],
-            "Backend (Node.js)": [10, 11, 12, 17],
-            "Databases (SQL)": [13, 14, 15],
-            "Data Structures (DSA)": [2, 3, 4, 19],
-        }
+        self._courses_cache = {}
+
+        # Bobot hasil ujian sekarang vs riwayat saat menggabungkan tingkat salah per topik
+        self.alpha = 0.6
 
         # Map group ke course (judul sesuai halaman Course di frontend)
         self.group_course_map = {
@@ -70,58 +49,75 @@ class LearningPathDSS:
             "Data Structures (DSA)": ["Big O Notation", "Arrays", "Linked Lists"],
         }
 
-    def analyze_performance(self, user_id: str, answers: list, correct_indices: list, package: str = "pro"):
-        total = len(answers)
-        score = sum(1 for i, ans in enumerate(answers) if ans == str(correct_indices[i]))
+    def topic_counts(self, answers: list, exam_id: str = None):
+        """Jumlah soal dan jumlah salah per topik untuk satu lembar jawaban."""
+        exam = get_exam(exam_id)
+        _, wrong = exam.grade(exam.encode([answers]))
+        topic_counts = {t: int(c) for t, c in zip(exam.topics, exam.topic_totals)}
+        topic_wrong = {t: int(w) for t, w in zip(exam.topics, wrong[0]) if w > 0}
+        return topic_counts, topic_wrong
+
+    def history_rates(self, conn, user_id: str) -> dict:
+        """Tingkat salah historis per topik dari tabel agregat user_topic_stats (O(jumlah topik), tanpa scan riwayat)."""
+        rows = conn.execute("SELECT topic, wrong, total FROM user_topic_stats WHERE user_id = ?", (user_id,)).fetchall()
+        return {r[0]: float(r[1]) / r[2] for r in rows if r[2] > 0}
+
+    def record_submission(self, conn, user_id: str, answers: list, exam_id: str = None):
+        """
+        Perbarui agregat salah/total per topik milik user; dipanggil di transaksi yang sama dengan INSERT submission.
+        Nilai lama diluruhkan DSS_HISTORY_DECAY per submission, jadi riwayat terbaru lebih berbobot.
+        Hanya lembar jawaban lengkap yang dihitung, sama seperti riwayat sebelumnya.
+        """
+        if len(answers) != len(get_exam(exam_id)):
+            return
+        counts, wrong = self.topic_counts(answers, exam_id)
+        conn.executemany(
+            """
+            INSERT INTO user_topic_stats (user_id, topic, wrong, total) VALUES (?, ?, ?, ?)
+            ON CONFLICT(user_id, topic) DO UPDATE SET
+                wrong = wrong * ? + excluded.wrong,
+                total = total * ? + excluded.total
+            """,
+            [(user_id, t, float(wrong.get(t, 0)), float(c), DSS_HISTORY_DECAY, DSS_HISTORY_DECAY) for t, c in counts.items()],
+        )
+
+    def analyze_performance(self, user_id: str, answers: list, package: str = "pro", conn=None, exam_id: str = None):
+        exam = get_exam(exam_id)
+        total = len(exam)
+        topic_counts, topic_wrong = self.topic_counts(answers, exam_id)
+        score = total - sum(topic_wrong.values())
         percentage = (score / total) * 100
 
         # Current exam wrong rate per topic
-        topic_counts = {}
-        topic_wrong = {}
-        for i, ans in enumerate(answers):
-            topic = self.topic_map.get(i, "Unknown")
-            topic_counts[topic] = topic_counts.get(topic, 0) + 1
-            if ans != str(correct_indices[i]):
-                topic_wrong[topic] = topic_wrong.get(topic, 0) + 1
         current_rate = {t: (topic_wrong.get(t, 0) / max(1, c)) for t, c in topic_counts.items()}
 
-        # Historical wrong rate via pandas (last 5 submissions with 20 questions)
+        # Historical wrong rate dari agregat per user (diperbarui saat submit)
         hist_rate = {t: 0.0 for t in current_rate.keys()}
         try:
-            conn = sqlite3.connect(DB_PATH)
-            df = pd.read_sql_query(
-                "SELECT answers, total, created_at FROM exam_submissions WHERE user_id = ? ORDER BY id DESC LIMIT 50",
-                conn,
-                params=(user_id,),
-            )
-            rows = []
-            for _, r in df.iterrows():
-                try:
-                    ans_list = json.loads(r["answers"]) if r["answers"] else []
-                except:
-                    ans_list = []
-                if len(ans_list) != 20:
-                    continue
-                for qi, a in enumerate(ans_list):
-                    rows.append({
-                        "q": qi,
-                        "answer": str(a),
-                        "correct": str(correct_indices[qi]),
-                        "topic": self.topic_map.get(qi, "Unknown"),
-                        "is_wrong": str(a) != str(correct_indices[qi]),
-                    })
-            if rows:
-                hdf = pd.DataFrame(rows)
-                agg = hdf.groupby("topic")["is_wrong"].mean()
-                for t, val in agg.items():
-                    hist_rate[t] = float(val)
+            for t, val in self.history_rates(conn or get_db(), user_id).items():
+                if t in hist_rate:
+                    hist_rate[t] = val
         except Exception:
             pass
 
         # Blend current and history (EMA style)
-        alpha = 0.6
+        alpha = self.alpha
         blended = {t: alpha * current_rate.get(t, 0.0) + (1 - alpha) * hist_rate.get(t, 0.0) for t in current_rate.keys()}
+        recommendations, total_hours = self.recommend(blended, topic_counts, package)
+
+        return {
+            "score": score,
+            "total": total,
+            "percentage": round(percentage, 1),
+            "package": self.packages[package]["name"],
+            "weak_areas": [r["topic"] for r in recommendations],
+            "recommendations": recommendations,
+            "total_study_hours": total_hours,
+            "learning_path_url": f"https://academy.kulyeah.com/path/{package}/recommended?weak={','.join([r['topic'].lower().replace(' ', '-') for r in recommendations])}"
+        }
 
+    def recommend(self, blended: dict, topic_counts: dict, package: str = "pro"):
+        """Rekomendasi + total jam belajar dari tingkat salah gabungan per topik (dipakai juga oleh analisis ulang massal)."""
         # Rank weak areas
         ranked = sorted(blended.items(), key=lambda x: x[1], reverse=True)
         weak_topics = [t for t, r in ranked if r > 0][:4]
@@ -149,17 +145,7 @@ class LearningPathDSS:
             total_hours += hours
             if total_hours >= self.packages[package]["max_hours"]:
                 break
-
-        return {
-            "score": score,
-            "total": total,
-            "percentage": round(percentage, 1),
-            "package": self.packages[package]["name"],
-            "weak_areas": [r["topic"] for r in recommendations],
-            "recommendations": recommendations,
-            "total_study_hours": total_hours,
-            "learning_path_url": f"https://academy.kulyeah.com/path/{package}/recommended?weak={','.join([r['topic'].lower().replace(' ', '-') for r in recommendations])}"
-        }
+        return recommendations, total_hours
 
     def _get_group(self, topic_name):
         # In new schema, topic_name already equals group
@@ -182,9 +168,75 @@ class LearningPathDSS:
             return base.get(topic, "Basic Video Series")
 
     def _get_courses(self, group_name):
+        # Di-cache per (group, daftar judul): quote() URL mendominasi biaya analisis ulang massal
         titles = self.group_course_map.get(group_name, [group_name])
-        mod = quote(group_name, safe="")
-        return [{
-            "title": t,
-            "href": f"/course?title={mod}&lesson={quote(t, safe='')}"
-        } for t in titles]
+        key = (group_name, tuple(titles))
+        if key not in self._courses_cache:
+            mod = quote(group_name, safe="")
+            self._courses_cache[key] = [{
+                "title": t,
+                "href": f"/course?title={mod}&lesson={quote(t, safe='')}"
+            } for t in titles]
+        return self._courses_cache[key]
+
+
+def rebuild_topic_stats(conn, chunk: int = 20000):
+    """
+    Bangun ulang user_topic_stats dari seluruh exam_submissions (backfill migrasi, atau setelah kunci jawaban dikoreksi).
+    Hasilnya sama dengan memanggil record_submission untuk setiap submission berurutan: bobot submission ke-k dari
+    belakang milik user itu adalah DSS_HISTORY_DECAY ** k, dihitung vektor per user dengan np.add.reduceat.
+    """
+    exams = load_exams()
+    topics = list(dict.fromkeys(t for e in exams.values() for t in e.topics))
+    cols = {r[1] for r in conn.execute("PRAGMA table_info(exam_submissions)")}
+    exam_col = "exam_id" if "exam_id" in cols else "NULL"
+    users, wrong_parts, total_parts = [], [], []
+    cur = conn.execute(f"SELECT user_id, {exam_col}, answers FROM exam_submissions ORDER BY user_id, id")
+    while True:
+        rows = cur.fetchmany(chunk)
+        if not rows:
+            break
+        by_exam = {}
+        for pos, (user_id, exam_id, answers) in enumerate(rows):
+            try:
+                ans_list = json.loads(answers) if answers else []
+            except Exception:
+                continue
+            exam = exams.get(exam_id or DEFAULT_EXAM_ID)
+            if exam is not None and len(ans_list) == len(exam):
+                by_exam.setdefault(exam.exam_id, []).append((pos, ans_list))
+        wrong = np.zeros((len(rows), len(topics)), dtype=np.float64)
+        total = np.zeros((len(rows), len(topics)), dtype=np.float64)
+        keep = np.zeros(len(rows), dtype=bool)
+        for exam_id, items in by_exam.items():
+            exam = exams[exam_id]
+            idx = np.array([p for p, _ in items])
+            cols_t = [topics.index(t) for t in exam.topics]
+            _, tw = exam.grade(exam.encode([a for _, a in items]))
+            wrong[np.ix_(idx, cols_t)] = tw
+            total[np.ix_(idx, cols_t)] = exam.topic_totals
+            keep[idx] = True
+        users.extend(r[0] for r, k in zip(rows, keep) if k)
+        wrong_parts.append(wrong[keep])
+        total_parts.append(total[keep])
+
+    conn.execute("DELETE FROM user_topic_stats")
+    if not users:
+        return 0
+    users = np.array(users, dtype=object)
+    wrong, total = np.vstack(wrong_parts), np.vstack(total_parts)
+    starts = np.flatnonzero(np.r_[True, users[1:] != users[:-1]])
+    ends = np.r_[starts[1:], len(users)]
+    # posisi dari belakang dalam grup user: submission terakhir berbobot 1
+    rank = np.repeat(ends, ends - starts) - np.arange(len(users)) - 1
+    w = (DSS_HISTORY_DECAY ** rank)[:, None]
+    wrong_sum = np.add.reduceat(wrong * w, starts, axis=0)
+    total_sum = np.add.reduceat(total * w, starts, axis=0)
+    conn.executemany(
+        "INSERT INTO user_topic_stats (user_id, topic, wrong, total) VALUES (?, ?, ?, ?)",
+        [
+            (users[s], topics[j], float(wrong_sum[i, j]), float(total_sum[i, j]))
+            for i, s in enumerate(starts) for j in range(len(topics)) if total_sum[i, j] > 0
+        ],
+    )
+    return len(starts)
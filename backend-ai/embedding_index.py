@@ -0,0 +1,131 @@
+# backend-ai/embedding_index.py
+# Indeks embedding ArcFace untuk /login-face: satu matriks float32 ter-normalisasi + array id paralel.
+import threading
+import numpy as np
+from config import IVF_THRESHOLD, IVF_NPROBE
+
+
+def _normalize(m):
+    m = np.asarray(m, dtype=np.float32)
+    norms = np.linalg.norm(m, axis=-1, keepdims=True)
+    return m / (norms + 1e-8)
+
+
+class EmbeddingIndex:
+    """
+    Identifikasi = satu perkalian matriks-vektor (cosine, karena semua baris sudah dinormalisasi) + argmax/top-k.
+    Kalau jumlah user >= IVF_THRESHOLD, dibangun indeks IVF sederhana (k-means NumPy) dan pencarian
+    hanya memeriksa IVF_NPROBE cluster terdekat.
+    Snapshot (ids, matrix, ivf) selalu diganti utuh, jadi search() tidak pernah melihat state setengah jadi.
+    k-means hanya dijalankan saat training penuh; centroid ikut disimpan, jadi reload di worker lain cukup
+    meng-assign ulang baris ke centroid itu, dan remove() hanya membuang satu baris dari inverted list-nya.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snap = (np.empty(0, dtype=object), np.zeros((0, 0), dtype=np.float32), None)
+
+    def __len__(self):
+        return len(self._snap[0])
+
+    def ids(self) -> list:
+        return list(self._snap[0])
+
+    def snapshot(self):
+        """(ids, matrix, centroids IVF atau None) untuk disimpan EmbeddingStore.save_index."""
+        ids, matrix, ivf = self._snap
+        return list(ids), matrix, ivf[0] if ivf is not None else None
+
+    def set_all(self, ids: list, vectors, centroids=None):
+        """Ganti seluruh isi indeks. centroids (hasil snapshot sebelumnya) dipakai ulang alih-alih k-means baru."""
+        with self._lock:
+            ids = np.array(list(ids), dtype=object)
+            matrix = _normalize(vectors) if len(ids) else np.zeros((0, 0), dtype=np.float32)
+            self._snap = (ids, matrix, self._build_ivf(matrix, centroids))
+
+    def upsert(self, user_id: str, vec):
+        v = _normalize(vec).reshape(1, -1)
+        with self._lock:
+            ids, matrix, ivf = self._snap
+            hit = np.nonzero(ids == user_id)[0]
+            if len(hit):
+                matrix = matrix.copy()
+                matrix[hit[0]] = v[0]
+                row = int(hit[0])
+            else:
+                ids = np.append(ids, np.array([user_id], dtype=object))
+                matrix = np.vstack([matrix, v]) if len(matrix) else v
+                row = len(ids) - 1
+            if ivf is None:
+                ivf = self._build_ivf(matrix)
+            else:
+                ivf = self._ivf_assign(ivf, row, v[0], replace=len(hit) > 0)
+            self._snap = (ids, matrix, ivf)
+
+    def remove(self, user_id: str):
+        with self._lock:
+            ids, matrix, ivf = self._snap
+            hit = np.nonzero(ids == user_id)[0]
+            if not len(hit):
+                return
+            row = int(hit[0])
+            ids, matrix = np.delete(ids, row), np.delete(matrix, row, axis=0)
+            if ivf is not None and len(ids) >= IVF_THRESHOLD:
+                # Baris setelah row bergeser satu; centroid tetap, tidak ada k-means ulang
+                centroids, lists = ivf
+                ivf = centroids, [lst[lst != row] - (lst[lst != row] > row) for lst in lists]
+            else:
+                ivf = None
+            self._snap = (ids, matrix, ivf)
+
+    def search(self, vec, k: int = 1) -> list:
+        """Mengembalikan [(user_id, cosine_distance), ...] terurut dari yang paling dekat."""
+        ids, matrix, ivf = self._snap
+        if len(ids) == 0:
+            return []
+        q = _normalize(vec).ravel()
+        if ivf is not None:
+            centroids, lists = ivf
+            nprobe = min(IVF_NPROBE, len(centroids))
+            probe = np.argpartition(-(centroids @ q), nprobe - 1)[:nprobe]
+            cand = np.concatenate([lists[c] for c in probe])
+            if len(cand) == 0:
+                cand = np.arange(len(ids))
+        else:
+            cand = None
+        sims = matrix @ q if cand is None else matrix[cand] @ q
+        k = min(k, len(sims))
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top])]
+        rows = top if cand is None else cand[top]
+        return [(ids[r], float(1.0 - sims[t])) for r, t in zip(rows, top)]
+
+    @staticmethod
+    def _build_ivf(matrix, centroids=None, iters: int = 10):
+        n = len(matrix)
+        if n < IVF_THRESHOLD:
+            return None
+        if centroids is None or len(centroids) == 0 or np.shape(centroids)[1] != matrix.shape[1]:
+            nlist = max(1, int(np.sqrt(n)))
+            rng = np.random.default_rng(0)
+            centroids = matrix[rng.choice(n, nlist, replace=False)].copy()
+            for _ in range(iters):
+                assign = np.argmax(matrix @ centroids.T, axis=1)
+                for c in range(nlist):
+                    members = matrix[assign == c]
+                    if len(members):
+                        centroids[c] = members.mean(axis=0)
+                centroids = _normalize(centroids)
+        else:
+            centroids = _normalize(centroids)
+        assign = np.argmax(matrix @ centroids.T, axis=1)
+        order = np.argsort(assign, kind="stable")
+        lists = np.split(order, np.searchsorted(assign[order], np.arange(1, len(centroids))))
+        return centroids, lists
+
+    @staticmethod
+    def _ivf_assign(ivf, row: int, v, replace: bool):
+        centroids, lists = ivf
+        lists = [lst[lst != row] for lst in lists] if replace else list(lists)
+        c = int(np.argmax(centroids @ v))
+        lists[c] = np.append(lists[c], row)
+        return centroids, lists
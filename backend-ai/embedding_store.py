@@ -0,0 +1,193 @@
+# backend-ai/embedding_store.py
+# Cache embedding ArcFace di disk, dikunci dengan hash isi file crop, supaya tidak dihitung ulang setelah restart.
+import bisect
+import hashlib
+import json
+import os
+import numpy as np
+from config import EMBEDDINGS_DIR, EMBEDDINGS_MAX_SEGMENTS
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    Embedding per gambar disimpan sebagai segmen .npy append-only (dibuka dengan mmap) + manifest hash -> baris.
+    Baris global dihitung berurutan lintas segmen. Enroll inkremental hanya menulis segmen kecil berisi embedding
+    baru; seluruh matriks ditulis ulang menjadi satu segmen hanya saat training penuh (keep) atau saat jumlah
+    segmen melewati EMBEDDINGS_MAX_SEGMENTS.
+    Rata-rata per user (isi EmbeddingIndex) disimpan terpisah supaya /login-face langsung siap saat startup.
+    Segmen tidak pernah ditimpa; segmen yang tidak lagi dirujuk manifest dibuang setelah manifest diganti
+    (os.replace tidak bisa menimpa file yang masih di-mmap di Windows).
+    """
+    def __init__(self, root: str = EMBEDDINGS_DIR, max_segments: int = EMBEDDINGS_MAX_SEGMENTS):
+        self.root = root
+        self.max_segments = max_segments
+        os.makedirs(root, exist_ok=True)
+        self.manifest_path = os.path.join(root, "manifest.json")
+        self.generation = 0
+        self.next_segment = 1
+        self.rows = {}
+        self.segments = []
+        self._vectors, self._starts = [], []
+        self._pending = {}
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path) as f:
+                    manifest = json.load(f)
+                self.generation = int(manifest.get("generation", 0))
+                self.next_segment = int(manifest.get("next_segment", self.generation + 1))
+                self.rows = manifest.get("rows", {})
+                if "segments" in manifest:
+                    self.segments = manifest["segments"]
+                elif manifest.get("vectors"):
+                    # Format lama: satu file vectors_<g>.npy per generasi
+                    self.segments = [{"file": manifest["vectors"], "rows": len(self.rows)}]
+                self._open_segments()
+            except Exception as e:
+                print(f"[AI-PROCTOR] Embedding cache unreadable ({e}). Embeddings will be recomputed.")
+                self.rows, self.segments, self._vectors, self._starts = {}, [], [], []
+        self._sig = self._signature()
+
+    def _open_segments(self):
+        self._vectors, self._starts, start = [], [], 0
+        for seg in self.segments:
+            vec = np.load(os.path.join(self.root, seg["file"]), mmap_mode="r")
+            self._vectors.append(vec)
+            self._starts.append(start)
+            start += len(vec)
+
+    def _signature(self):
+        sig = []
+        for fn in ("manifest.json", "user_ids.json"):
+            try:
+                st = os.stat(os.path.join(self.root, fn))
+                sig.append((st.st_mtime_ns, st.st_size, st.st_ino))
+            except OSError:
+                sig.append(None)
+        return tuple(sig)
+
+    def changed(self) -> bool:
+        """True kalau proses lain menulis manifest/indeks user sejak state ini dimuat atau terakhir ditulis sendiri."""
+        return self._signature() != self._sig
+
+    def __len__(self):
+        return len(self.rows)
+
+    def get(self, key: str):
+        if key in self._pending:
+            return self._pending[key]
+        row = self.rows.get(key)
+        if row is None or not self._vectors:
+            return None
+        i = bisect.bisect_right(self._starts, row) - 1
+        return np.asarray(self._vectors[i][row - self._starts[i]], dtype=np.float32)
+
+    def add(self, key: str, vec):
+        self._pending[key] = np.asarray(vec, dtype=np.float32).ravel()
+
+    def flush(self, keep: set = None):
+        """
+        Simpan embedding baru. Tanpa keep: embedding baru ditambahkan sebagai satu segmen, segmen lama tidak disentuh.
+        Dengan keep (training penuh): hash yang tidak dipakai lagi dibuang dan semua baris ditulis ulang ke satu segmen.
+        """
+        if not self._pending and (keep is None or set(self.rows) <= keep):
+            return
+        if keep is None and len(self.segments) < self.max_segments:
+            total = self._starts[-1] + len(self._vectors[-1]) if self._vectors else 0
+            keys = list(self._pending)
+            seg = self._write_segment(np.vstack(list(self._pending.values())))
+            rows = dict(self.rows)
+            rows.update((k, total + i) for i, k in enumerate(keys))
+            self._publish(self.segments + [seg], rows)
+            return
+
+        keys, parts = [], []
+        old = [(k, r) for k, r in self.rows.items() if (keep is None or k in keep) and k not in self._pending]
+        if old:
+            keys.extend(k for k, _ in old)
+            parts.append(self._gather(np.array([r for _, r in old])))
+        if self._pending:
+            keys.extend(self._pending)
+            parts.append(np.vstack(list(self._pending.values())))
+        segments = [self._write_segment(np.vstack(parts))] if parts else []
+        self._publish(segments, {k: i for i, k in enumerate(keys)})
+
+    def _gather(self, rows):
+        """Baris global -> matriks float32, dibaca per segmen dengan fancy indexing."""
+        out = np.empty((len(rows), self._vectors[0].shape[1]), dtype=np.float32)
+        seg = np.searchsorted(self._starts, rows, side="right") - 1
+        for i, vec in enumerate(self._vectors):
+            mask = seg == i
+            if mask.any():
+                out[mask] = vec[rows[mask] - self._starts[i]]
+        return out
+
+    def _write_segment(self, vectors) -> dict:
+        name = f"vectors_{self.next_segment}.npy"
+        self.next_segment += 1
+        tmp = os.path.join(self.root, name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, np.asarray(vectors, dtype=np.float32))
+        os.replace(tmp, os.path.join(self.root, name))
+        return {"file": name, "rows": int(len(vectors))}
+
+    def _publish(self, segments: list, rows: dict):
+        self.generation += 1
+        self._write_manifest({"generation": self.generation, "next_segment": self.next_segment,
+                              "segments": segments, "rows": rows})
+        self.segments, self.rows = segments, rows
+        self._open_segments()
+        self._pending = {}
+        self._cleanup(keep_names={seg["file"] for seg in segments})
+
+    def save_index(self, ids: list, matrix, centroids=None):
+        np.save(os.path.join(self.root, "user_index.tmp.npy"), np.asarray(matrix, dtype=np.float32))
+        os.replace(os.path.join(self.root, "user_index.tmp.npy"), os.path.join(self.root, "user_index.npy"))
+        # Centroid IVF ditulis sebelum user_ids.json (pemicu reload di worker lain); hilang/basi = k-means ulang
+        cent_path = os.path.join(self.root, "user_centroids.npy")
+        if centroids is not None:
+            np.save(os.path.join(self.root, "user_centroids.tmp.npy"), np.asarray(centroids, dtype=np.float32))
+            os.replace(os.path.join(self.root, "user_centroids.tmp.npy"), cent_path)
+        elif os.path.exists(cent_path):
+            os.remove(cent_path)
+        tmp = os.path.join(self.root, "user_ids.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(list(ids), f)
+        os.replace(tmp, os.path.join(self.root, "user_ids.json"))
+        self._sig = self._signature()
+
+    def load_index(self):
+        """(ids, matrix, centroids) indeks user tersimpan; centroids None kalau indeks belum memakai IVF."""
+        ids_path = os.path.join(self.root, "user_ids.json")
+        mat_path = os.path.join(self.root, "user_index.npy")
+        cent_path = os.path.join(self.root, "user_centroids.npy")
+        if not (os.path.exists(ids_path) and os.path.exists(mat_path)):
+            return [], None, None
+        try:
+            with open(ids_path) as f:
+                ids = json.load(f)
+            matrix = np.load(mat_path)
+            if len(ids) != len(matrix):
+                return [], None, None
+            centroids = np.load(cent_path) if os.path.exists(cent_path) else None
+            return ids, matrix, centroids
+        except Exception:
+            return [], None, None
+
+    def _write_manifest(self, manifest: dict):
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp, self.manifest_path)
+        self._sig = self._signature()
+
+    def _cleanup(self, keep_names: set):
+        for fn in os.listdir(self.root):
+            if fn.startswith("vectors_") and fn not in keep_names:
+                try:
+                    os.remove(os.path.join(self.root, fn))
+                except Exception:
+                    pass
@@ -0,0 +1,95 @@
+# backend-ai/enrollment.py
+# Ekstraksi crop wajah dari video enroll: decode di satu thread, deteksi + crop di worker pool.
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+from config import ENROLL_WORKERS, ENROLL_DEDUP_THRESHOLD
+
+
+def _thumb(crop):
+    return cv2.resize(crop, (16, 16), interpolation=cv2.INTER_AREA).astype(np.float32)
+
+
+def extract_video_crops(video_path: str, detect, target: int = 120, step: int = 3, min_keep: int = 30) -> list:
+    """
+    Mengembalikan maksimal `target` crop 200x200 grayscale dari video, urut sesuai frame.
+    detect(gray) -> list bbox (FaceProctor._detect). Crop yang nyaris identik dengan crop yang baru saja
+    diterima disisihkan ke cadangan, dan hanya dipakai lagi kalau total crop beragam kurang dari min_keep.
+    """
+    stop = threading.Event()
+    futures = queue.Queue(maxsize=ENROLL_WORKERS * 2)
+
+    def work(frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return [cv2.resize(gray[y:y+h, x:x+w], (200, 200)) for (x, y, w, h) in detect(gray)]
+
+    def offer(item) -> bool:
+        # put() dengan batas waktu: kalau konsumen berhenti (stop), decoder tidak boleh tertahan di antrean penuh
+        while not stop.is_set():
+            try:
+                futures.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def decode(pool):
+        cap = cv2.VideoCapture(video_path)
+        frame_count = 0
+        try:
+            while cap.isOpened() and not stop.is_set():
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                if frame_count % step == 0:
+                    fut = pool.submit(work, frame)
+                    if not offer(fut):
+                        fut.cancel()
+                        break
+                frame_count += 1
+        finally:
+            cap.release()
+            offer(None)
+
+    def drain():
+        while True:
+            try:
+                fut = futures.get_nowait()
+            except queue.Empty:
+                return
+            if fut is not None:
+                fut.cancel()
+
+    accepted, reserve, recent = [], [], []
+    with ThreadPoolExecutor(max_workers=ENROLL_WORKERS) as pool:
+        decoder = threading.Thread(target=decode, args=(pool,), daemon=True)
+        decoder.start()
+        try:
+            while True:
+                fut = futures.get()
+                if fut is None:
+                    break
+                if len(accepted) >= target:
+                    continue
+                for crop in fut.result():
+                    if len(accepted) >= target:
+                        stop.set()
+                        break
+                    t = _thumb(crop)
+                    if recent and np.min(np.mean(np.abs(np.stack(recent) - t), axis=(1, 2))) < ENROLL_DEDUP_THRESHOLD:
+                        reserve.append(crop)
+                        continue
+                    accepted.append(crop)
+                    recent = (recent + [t])[-8:]
+        finally:
+            # Selesai atau gagal (fut.result() melempar): hentikan decoder, batalkan frame yang belum dikerjakan
+            stop.set()
+            drain()
+            decoder.join()
+            drain()
+
+    if len(accepted) < min_keep:
+        accepted.extend(reserve[:min_keep - len(accepted)])
+    return accepted
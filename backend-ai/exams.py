@@ -0,0 +1,124 @@
+# backend-ai/exams.py
+# Definisi ujian (kunci jawaban + topik per soal) dari EXAMS_PATH, dikompilasi sekali menjadi array NumPy.
+import json
+import numpy as np
+from config import EXAMS_PATH, DEFAULT_EXAM_ID
+
+# Pilihan jawaban yang dikenal (indeks opsi, sebagai string kanonik dari frontend atau int)
+_CODES = {**{str(i): i for i in range(32)}, **{i: i for i in range(32)}}
+_ANSWER_TYPES = (str, int)
+
+
+def answer_code(a) -> int:
+    """Satu-satunya normalisasi jawaban: "1"/1 -> 1; kosong, "01", " 1", bool, atau tidak dikenal -> -1 (salah)."""
+    # type() persis, bukan isinstance: bool (True == 1) dan subclass lain tidak dianggap jawaban
+    return _CODES.get(a, -1) if type(a) in _ANSWER_TYPES else -1
+
+
+class CompiledExam:
+    """
+    key: (Q,) int16 kunci jawaban; onehot: (Q, T) float32 soal -> topik.
+    Penilaian satu batch lembar jawaban (N x Q) = satu perbandingan dengan key, lalu salah @ onehot
+    untuk jumlah salah per topik, tanpa loop Python per soal.
+    """
+    def __init__(self, exam_id: str, answers: list, topics: list, title: str = ""):
+        if len(answers) != len(topics):
+            raise ValueError(f"Exam {exam_id}: {len(answers)} answers but {len(topics)} topics")
+        self.exam_id = exam_id
+        self.title = title
+        self.key = np.asarray(answers, dtype=np.int16)
+        self.topics = list(dict.fromkeys(topics))
+        self.question_topic = np.array([self.topics.index(t) for t in topics], dtype=np.int32)
+        self.onehot = np.zeros((len(answers), len(self.topics)), dtype=np.float32)
+        self.onehot[np.arange(len(answers)), self.question_topic] = 1.0
+        self.topic_totals = self.onehot.sum(axis=0)
+
+    def __len__(self):
+        return len(self.key)
+
+    def topic_map(self) -> dict:
+        return {i: self.topics[t] for i, t in enumerate(self.question_topic)}
+
+    def topic_groups(self) -> dict:
+        return {t: [int(i) for i in np.nonzero(self.question_topic == j)[0]] for j, t in enumerate(self.topics)}
+
+    def encode(self, answer_lists: list):
+        """(N, Q) int16 dari lembar jawaban berisi string ("1", "" untuk kosong) lewat answer_code(); kurang = -1."""
+        q = len(self.key)
+        full = [a for a in answer_lists if len(a) == q]
+        if len(full) == len(answer_lists):
+            # jalur cepat: semua lembar lengkap, cukup satu lookup dict per jawaban
+            flat = np.fromiter(map(answer_code, (x for a in full for x in a)), dtype=np.int16, count=len(full) * q)
+            return flat.reshape(len(full), q)
+        out = np.full((len(answer_lists), q), -1, dtype=np.int16)
+        for r, answers in enumerate(answer_lists):
+            for i, a in enumerate(answers[:q]):
+                out[r, i] = answer_code(a)
+        return out
+
+    def grade(self, encoded):
+        """Mengembalikan (skor (N,), jumlah salah per topik (N, T)) untuk array hasil encode()."""
+        wrong = encoded != self.key
+        return len(self.key) - wrong.sum(axis=1), wrong.astype(np.float32) @ self.onehot
+
+    def score_batch(self, answer_lists: list) -> dict:
+        """Nilai banyak lembar jawaban sekaligus (dipakai saat kunci jawaban dikoreksi / analisis ulang)."""
+        score, topic_wrong = self.grade(self.encode(answer_lists))
+        return {
+            "score": score,
+            "total": len(self.key),
+            "percentage": np.round(score * 100.0 / len(self.key), 1),
+            "topic_wrong": topic_wrong,
+            "topic_rate": topic_wrong / self.topic_totals,
+        }
+
+
+def load_exams(path: str = EXAMS_PATH) -> dict:
+    with open(path) as f:
+        data = json.load(f)
+    return {eid: CompiledExam(eid, d["answers"], d["topics"], d.get("title", "")) for eid, d in data.items()}
+
+
+_EXAMS = None
+
+
+def get_exam(exam_id: str = None) -> CompiledExam:
+    """Ujian terkompilasi (dimuat sekali per proses). KeyError kalau exam_id tidak dikenal."""
+    global _EXAMS
+    if _EXAMS is None:
+        _EXAMS = load_exams()
+    return _EXAMS[exam_id or DEFAULT_EXAM_ID]
+
+
+def rescore_submissions(conn, exam_id: str = None, chunk: int = 5000) -> int:
+    """
+    Nilai ulang semua submission satu ujian dengan kunci jawaban saat ini (misalnya setelah kunci dikoreksi):
+    dibaca per chunk, dinilai vektor, ditulis dengan executemany dalam satu transaksi. user_topic_stats ikut dibangun ulang.
+    Mengembalikan jumlah submission yang dinilai ulang.
+    """
+    from dss_engine import rebuild_topic_stats
+    exam = get_exam(exam_id)
+    done, last_id = 0, 0
+    with conn:
+        while True:
+            rows = conn.execute(
+                "SELECT id, answers FROM exam_submissions WHERE exam_id = ? AND id > ? ORDER BY id LIMIT ?",
+                (exam.exam_id, last_id, chunk),
+            ).fetchall()
+            if not rows:
+                break
+            lists = []
+            for r in rows:
+                try:
+                    lists.append(json.loads(r[1]) if r[1] else [])
+                except Exception:
+                    lists.append([])
+            res = exam.score_batch(lists)
+            conn.executemany(
+                "UPDATE exam_submissions SET score = ?, total = ?, percentage = ? WHERE id = ?",
+                [(int(s), res["total"], float(p), r[0]) for s, p, r in zip(res["score"], res["percentage"], rows)],
+            )
+            done += len(rows)
+            last_id = rows[-1][0]
+        rebuild_topic_stats(conn)
+    return done
@@ -0,0 +1,147 @@
+# backend-ai/face_store.py
+# Penyimpanan crop wajah terpaket: satu file uint8 (N x 200 x 200) per user + indeks kecil,
+# pengganti ribuan JPEG kecil di DATASET_DIR.
+# Migrasi satu kali: python face_store.py --migrate
+import argparse
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+from urllib.parse import quote
+import cv2
+import numpy as np
+from config import FACES_DIR, DATASET_DIR
+
+try:
+    import fcntl
+except ImportError:  # Windows: cukup kunci antar-thread
+    fcntl = None
+
+CROP = 200
+
+
+class FaceStore:
+    """
+    <user>.u8 berisi crop 200x200 grayscale yang ditulis berurutan (append-only), dibaca lewat np.memmap
+    tanpa decode JPEG. <user>.json menyimpan user_id asli, jumlah crop, dan hash isi tiap crop
+    (kunci cache embedding ArcFace).
+    Penulisan crop + indeks satu user dikunci per user (lock thread + flock pada <user>.lock), jadi dua enroll
+    bersamaan untuk user yang sama, dari thread atau worker lain, tidak saling menimpa.
+    """
+    def __init__(self, root: str = FACES_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._guard = threading.Lock()
+        self._locks = {}
+
+    @contextmanager
+    def _locked(self, user_id: str):
+        with self._guard:
+            lock = self._locks.setdefault(user_id, threading.Lock())
+        with lock:
+            fd = None
+            if fcntl is not None:
+                fd = os.open(self._base(user_id) + ".lock", os.O_CREAT | os.O_RDWR)
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fd is not None:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+                    os.close(fd)
+
+    def _base(self, user_id: str) -> str:
+        return os.path.join(self.root, quote(user_id, safe="@._-"))
+
+    def _index(self, user_id: str) -> dict:
+        try:
+            with open(self._base(user_id) + ".json") as f:
+                return json.load(f)
+        except Exception:
+            return {"user_id": user_id, "count": 0, "hashes": []}
+
+    def users(self) -> list:
+        out = []
+        for fn in os.listdir(self.root):
+            if fn.endswith(".json"):
+                try:
+                    with open(os.path.join(self.root, fn)) as f:
+                        idx = json.load(f)
+                    if idx.get("count", 0) > 0:
+                        out.append(idx["user_id"])
+                except Exception:
+                    pass
+        return sorted(out)
+
+    def count(self, user_id: str) -> int:
+        return int(self._index(user_id).get("count", 0))
+
+    def hashes(self, user_id: str) -> list:
+        return self._index(user_id).get("hashes", [])
+
+    def append(self, user_id: str, crops: list) -> int:
+        """Tambahkan crop di akhir file user. Indeks ditulis setelah data, jadi crop yang belum terindeks diabaikan pembaca."""
+        with self._locked(user_id):
+            idx = self._index(user_id)
+            if crops:
+                data = np.ascontiguousarray(np.stack([cv2.resize(c, (CROP, CROP)) if c.shape != (CROP, CROP) else c for c in crops]), dtype=np.uint8)
+                with open(self._base(user_id) + ".u8", "r+b" if idx["count"] else "wb") as f:
+                    f.seek(idx["count"] * CROP * CROP)
+                    f.write(data.tobytes())
+                idx["hashes"] = idx.get("hashes", []) + [hashlib.sha1(c.tobytes()).hexdigest() for c in data]
+                idx["count"] = idx["count"] + len(data)
+                tmp = self._base(user_id) + ".json.tmp"
+                with open(tmp, "w") as f:
+                    json.dump(idx, f)
+                os.replace(tmp, self._base(user_id) + ".json")
+            return idx["count"]
+
+    def load(self, user_id: str):
+        """Array (N, 200, 200) uint8 zero-copy lewat np.memmap; kosong kalau user belum punya crop."""
+        n = self.count(user_id)
+        if n == 0:
+            return np.zeros((0, CROP, CROP), dtype=np.uint8)
+        return np.memmap(self._base(user_id) + ".u8", dtype=np.uint8, mode="r", shape=(n, CROP, CROP))
+
+    def remove(self, user_id: str):
+        with self._locked(user_id):
+            for ext in (".json", ".u8"):
+                try:
+                    os.remove(self._base(user_id) + ext)
+                except Exception:
+                    pass
+
+
+def migrate(dataset_dir: str = DATASET_DIR, store: FaceStore = None) -> int:
+    """Konversi folder dataset/<user>/*.jpg yang belum ada di store. Mengembalikan jumlah user yang dimigrasi."""
+    store = store or FaceStore()
+    if not os.path.isdir(dataset_dir):
+        return 0
+    migrated = 0
+    for uf in sorted(os.listdir(dataset_dir)):
+        folder = os.path.join(dataset_dir, uf)
+        if not os.path.isdir(folder) or store.count(uf) > 0:
+            continue
+        crops = []
+        for fn in sorted(os.listdir(folder)):
+            if fn.lower().endswith(('.jpg', '.jpeg', '.png')):
+                img = cv2.imread(os.path.join(folder, fn), cv2.IMREAD_GRAYSCALE)
+                if img is not None:
+                    crops.append(cv2.resize(img, (CROP, CROP)))
+        if crops:
+            store.append(uf, crops)
+            migrated += 1
+            print(f"[AI-PROCTOR] Migrated {len(crops)} crop(s) of {uf} to packed face store.")
+    return migrated
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--migrate", action="store_true", help="konversi DATASET_DIR ke FACES_DIR")
+    ap.add_argument("--dataset", default=DATASET_DIR)
+    args = ap.parse_args()
+    if args.migrate:
+        print(f"{migrate(args.dataset)} user(s) migrated.")
+    else:
+        ap.print_help()
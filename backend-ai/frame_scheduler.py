@@ -0,0 +1,135 @@
+# backend-ai/frame_scheduler.py
+# Scheduler frame proctoring lintas sesi: frame dari banyak ujian dibagikan terus-menerus ke thread pool (decode,
+# deteksi dan LBPH OpenCV melepas GIL) begitu ada worker kosong, hasilnya dikembalikan ke request yang menunggu.
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from config import SCHED_LATENCY_BUDGET_MS, SCHED_MAX_QUEUE, SCHED_WORKERS
+
+# Batas aman menunggu hasil (detik) kalau collector macet
+_WAIT_TIMEOUT = 30.0
+
+
+class _Item:
+    __slots__ = ("user_id", "frame", "preview", "deadline", "done", "result")
+
+    def __init__(self, user_id: str, frame: bytes, preview: bool, deadline: float):
+        self.user_id = user_id
+        self.frame = frame
+        self.preview = preview
+        self.deadline = deadline
+        self.done = threading.Event()
+        self.result = None
+
+    def finish(self, result: dict):
+        self.result = result
+        self.done.set()
+
+
+class FrameScheduler:
+    """
+    Antrean berisi paling banyak satu frame per sesi (user_id): frame baru dari sesi yang masih antre menggantikan
+    frame lama, dan semua request sesi itu menerima hasil frame terbaru.
+    Setiap sesi punya paling banyak satu frame in-flight, jadi state tracker per user aman; frame berikutnya dari sesi
+    itu menunggu di antrean sampai frame sebelumnya selesai. Selain itu tidak ada batch: setiap worker yang selesai
+    langsung mengambil frame antre tertua berikutnya, sehingga satu frame lambat tidak menahan frame sesi lain.
+    Saat lonjakan (ratusan siswa mulai ujian bersamaan) antrean menyerap beban: frame yang melewati latency budget
+    dijawab {"error": "stale"}, dan kalau antrean penuh request baru langsung dijawab {"error": "busy"}.
+    """
+    def __init__(self, proctor, budget_ms: float = SCHED_LATENCY_BUDGET_MS, max_queue: int = SCHED_MAX_QUEUE,
+                 workers: int = SCHED_WORKERS):
+        self.proctor = proctor
+        self.budget = budget_ms / 1000.0
+        self.max_queue = max_queue
+        self.workers = workers
+        self._start()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._start)
+
+    def _start(self):
+        # Juga dipanggil di proses hasil fork (serve.py): pool milik induk tidak ikut ter-fork
+        self._cond = threading.Condition()
+        self._queue = OrderedDict()
+        self._inflight = set()
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="frame")
+        self._frame_time = 0.02
+        self._stats = {"frames": 0, "superseded": 0, "expired": 0, "rejected": 0, "errors": 0}
+
+    def submit(self, user_id: str, frame: bytes, preview: bool = False) -> dict:
+        """Antrekan satu frame dan tunggu hasil verify_bytes(); blocking di thread request."""
+        with self._cond:
+            item = self._queue.get(user_id)
+            if item is not None:
+                item.frame = frame
+                item.preview = item.preview or preview
+                item.deadline = time.monotonic() + self.budget
+                self._stats["superseded"] += 1
+            elif len(self._queue) >= self.max_queue:
+                self._stats["rejected"] += 1
+                return {"error": "busy", "retry_after_ms": self._retry_after_ms()}
+            else:
+                item = _Item(user_id, frame, preview, time.monotonic() + self.budget)
+                self._queue[user_id] = item
+                self._dispatch()
+        if not item.done.wait(_WAIT_TIMEOUT):
+            return {"error": "timeout", "retry_after_ms": self._retry_after_ms()}
+        return item.result
+
+    def load(self) -> float:
+        """0..1: seberapa padat scheduler (antrean terhadap max_queue, perkiraan latensi terhadap latency budget)."""
+        wait = self._frame_time * (1.0 + len(self._queue) / float(self.workers))
+        return min(1.0, max(len(self._queue) / float(self.max_queue), wait / self.budget))
+
+    def _retry_after_ms(self) -> int:
+        # Perkiraan waktu sampai antrean saat ini habis: putaran worker tersisa x durasi rata-rata satu frame
+        rounds = math.ceil(len(self._queue) / float(self.workers)) or 1
+        return int(rounds * self._frame_time * 1000) + 1
+
+    def _dispatch(self):
+        """Isi worker kosong dengan frame antre tertua yang sesinya tidak sedang in-flight. Dipanggil dengan _cond."""
+        now = time.monotonic()
+        for user_id in list(self._queue):
+            if len(self._inflight) >= self.workers:
+                break
+            if user_id in self._inflight:
+                continue
+            item = self._queue.pop(user_id)
+            if item.deadline < now:
+                self._stats["expired"] += 1
+                item.finish({"error": "stale", "retry_after_ms": self._retry_after_ms()})
+                continue
+            self._inflight.add(user_id)
+            self._pool.submit(self._process, item)
+
+    def _process(self, item: _Item):
+        t0 = time.monotonic()
+        failed = False
+        try:
+            result = self.proctor.verify_bytes(item.frame, item.user_id, item.preview)
+        except Exception as e:
+            print(f"[ERROR] Frame verification failed for {item.user_id}: {e}")
+            failed = True
+            result = {"error": "verification_failed"}
+        with self._cond:
+            if failed:
+                self._stats["errors"] += 1
+            self._inflight.discard(item.user_id)
+            self._frame_time = 0.8 * self._frame_time + 0.2 * (time.monotonic() - t0)
+            self._stats["frames"] += 1
+            self._dispatch()
+        tracker = self.proctor.trackers.get(item.user_id)
+        if tracker is not None and "status" in result:
+            result["next_interval_ms"] = tracker.next_interval_ms(self.load())
+        item.finish(result)
+
+    def stats(self) -> dict:
+        with self._cond:
+            s = dict(self._stats)
+            s["queued"] = len(self._queue)
+            s["inflight"] = len(self._inflight)
+        s["frame_ms"] = round(self._frame_time * 1000, 2)
+        s["load"] = round(self.load(), 3)
+        return s
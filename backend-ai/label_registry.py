@@ -0,0 +1,56 @@
+# backend-ai/label_registry.py
+# Label id LBPH yang stabil per user, disimpan di samping model terlatih.
+import json
+import os
+from config import LABELS_PATH
+
+
+class LabelRegistry:
+    """
+    Pemetaan user_id -> label id yang tidak berubah walau folder dataset bertambah/berkurang.
+    User yang dihapus ditandai tombstone sampai histogramnya dibuang dari model (kompaksi).
+    "trained" mencatat berapa crop per user yang sudah masuk model, supaya enroll berikutnya cukup update().
+    """
+    def __init__(self, path: str = LABELS_PATH):
+        self.path = path
+        self.labels = {}
+        self.next_id = 0
+        self.tombstones = set()
+        self.trained = {}
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+                self.labels = {k: int(v) for k, v in data.get("labels", {}).items()}
+                self.next_id = int(data.get("next_id", 0))
+                self.tombstones = set(int(v) for v in data.get("tombstones", []))
+                self.trained = {k: int(v) for k, v in data.get("trained", {}).items()}
+            except Exception as e:
+                print(f"[AI-PROCTOR] Label registry unreadable ({e}). Labels will be reassigned on next training.")
+
+    def get_or_assign(self, user_id: str) -> int:
+        if user_id not in self.labels:
+            self.labels[user_id] = self.next_id
+            self.next_id += 1
+        return self.labels[user_id]
+
+    def remove(self, user_id: str):
+        label = self.labels.pop(user_id, None)
+        self.trained.pop(user_id, None)
+        if label is not None:
+            self.tombstones.add(label)
+        return label
+
+    def active(self) -> dict:
+        return dict(self.labels)
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({
+                "labels": self.labels,
+                "next_id": self.next_id,
+                "tombstones": sorted(self.tombstones),
+                "trained": self.trained,
+            }, f)
+        os.replace(tmp, self.path)
@@ -0,0 +1,184 @@
+# backend-ai/migrations.py
+# Migrasi skema SQLite berversi (PRAGMA user_version) + pemeriksaan query plan untuk query yang sering dipakai.
+# Jalankan manual: python migrations.py            -> terapkan migrasi yang belum jalan
+#                  python migrations.py --check    -> gagal (exit 1) kalau ada query panas yang full scan
+import argparse
+import sys
+from config import DB_PATH, DEFAULT_EXAM_ID
+from db import get_db
+
+
+def _backfill_topic_stats(conn):
+    """Isi user_topic_stats dari riwayat exam_submissions yang sudah ada."""
+    from dss_engine import rebuild_topic_stats
+    rebuild_topic_stats(conn)
+
+
+# Urutan tidak boleh diubah; migrasi baru selalu ditambahkan di akhir. Versi = indeks + 1.
+# Langkah migrasi berupa SQL, atau callable(conn) untuk backfill yang butuh Python.
+MIGRATIONS = [
+    (
+        "initial tables",
+        [
+            """
+            CREATE TABLE IF NOT EXISTS exam_submissions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT,
+                answers TEXT,
+                score INTEGER,
+                total INTEGER,
+                percentage REAL,
+                package TEXT,
+                weak_areas TEXT,
+                recommendations TEXT,
+                total_study_hours INTEGER,
+                created_at TEXT
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT,
+                email TEXT UNIQUE,
+                password_hash TEXT,
+                created_at TEXT
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS course_progress (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT,
+                module_title TEXT,
+                lesson_index INTEGER,
+                lesson_title TEXT,
+                completed INTEGER DEFAULT 0,
+                last_position REAL DEFAULT 0,
+                updated_at TEXT,
+                UNIQUE(user_id, module_title, lesson_index)
+            )
+            """,
+        ],
+    ),
+    (
+        "index exam_submissions by user",
+        [
+            # /submissions?user_id=, riwayat DSS (WHERE user_id = ? ORDER BY id DESC LIMIT ?) dan DELETE di /delete-account
+            "CREATE INDEX IF NOT EXISTS idx_exam_submissions_user_id ON exam_submissions(user_id, id)",
+        ],
+    ),
+    (
+        "materialized user topic stats",
+        [
+            # Agregat salah/total (terluruh) per user per topik, dipakai LearningPathDSS.analyze_performance
+            """
+            CREATE TABLE IF NOT EXISTS user_topic_stats (
+                user_id TEXT NOT NULL,
+                topic TEXT NOT NULL,
+                wrong REAL NOT NULL DEFAULT 0,
+                total REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, topic)
+            ) WITHOUT ROWID
+            """,
+            _backfill_topic_stats,
+        ],
+    ),
+    (
+        "exam id on submissions",
+        [
+            # Submission lama semuanya berasal dari ujian default
+            "ALTER TABLE exam_submissions ADD COLUMN exam_id TEXT",
+            f"UPDATE exam_submissions SET exam_id = '{DEFAULT_EXAM_ID}' WHERE exam_id IS NULL",
+        ],
+    ),
+]
+
+# Query panas yang wajib memakai index. course_progress sudah ter-index lewat UNIQUE(user_id, module_title, lesson_index).
+HOT_QUERIES = {
+    "submissions by user": ("SELECT * FROM exam_submissions WHERE user_id = ? ORDER BY id DESC LIMIT ?", ("u", 20)),
+    "dss history": ("SELECT answers, total, created_at FROM exam_submissions WHERE user_id = ? ORDER BY id DESC LIMIT 50", ("u",)),
+    "delete submissions": ("DELETE FROM exam_submissions WHERE user_id = ? OR user_id = ?", ("u", "1")),
+    "progress by user": ("SELECT * FROM course_progress WHERE 1=1 AND user_id = ? ORDER BY lesson_index ASC LIMIT ?", ("u", 100)),
+    "progress by user+module": ("SELECT * FROM course_progress WHERE 1=1 AND user_id = ? AND module_title = ? ORDER BY lesson_index ASC LIMIT ?", ("u", "m", 100)),
+    "progress upsert": (
+        "INSERT INTO course_progress (user_id, module_title, lesson_index, lesson_title, completed, last_position, updated_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(user_id, module_title, lesson_index) DO UPDATE SET completed=excluded.completed",
+        ("u", "m", 0, "t", 1, 0.0, ""),
+    ),
+    "topic stats by user": ("SELECT topic, wrong, total FROM user_topic_stats WHERE user_id = ?", ("u",)),
+    "delete topic stats": ("DELETE FROM user_topic_stats WHERE user_id = ? OR user_id = ?", ("u", "1")),
+    "delete progress": ("DELETE FROM course_progress WHERE user_id = ? OR user_id = ?", ("u", "1")),
+    "user by email": ("SELECT id, name, email FROM users WHERE email = ?", ("a@b.c",)),
+}
+
+
+def schema_version(conn) -> int:
+    return int(conn.execute("PRAGMA user_version").fetchone()[0])
+
+
+def migrate(conn=None) -> int:
+    """
+    Terapkan migrasi yang belum jalan, masing-masing dalam satu transaksi eksplisit (BEGIN ... COMMIT) bersama
+    PRAGMA user_version-nya. Mode transaksi bawaan modul sqlite3 meng-commit DDL (CREATE/ALTER) sendiri-sendiri,
+    jadi migrasi yang gagal di tengah jalan akan meninggalkan skema setengah jadi. Mengembalikan versi skema akhir.
+    """
+    conn = conn or get_db()
+    if conn.in_transaction:
+        conn.commit()
+    isolation = conn.isolation_level
+    conn.isolation_level = None
+    try:
+        version = schema_version(conn)
+        for i, (name, statements) in enumerate(MIGRATIONS[version:], start=version + 1):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Cek ulang di dalam lock tulis: worker lain mungkin sudah menerapkan migrasi ini
+                if schema_version(conn) >= i:
+                    conn.execute("COMMIT")
+                    continue
+                for sql in statements:
+                    if callable(sql):
+                        sql(conn)
+                    else:
+                        conn.execute(sql)
+                conn.execute(f"PRAGMA user_version = {i}")
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            print(f"[DB] Applied migration {i}: {name}")
+        return schema_version(conn)
+    finally:
+        conn.isolation_level = isolation
+
+
+def query_plan(conn, sql: str, params: tuple) -> list:
+    return [r[3] for r in conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()]
+
+
+def check_query_plans(conn=None) -> dict:
+    """
+    Mengembalikan {nama_query: [baris plan]} untuk query panas yang masih full scan tabel (SCAN <tabel> tanpa index).
+    Dict kosong berarti semua query panas tetap ter-index.
+    """
+    conn = conn or get_db()
+    bad = {}
+    for name, (sql, params) in HOT_QUERIES.items():
+        plan = query_plan(conn, sql, params)
+        if any(p.startswith("SCAN ") and "USING" not in p for p in plan):
+            bad[name] = plan
+    return bad
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--db", default=DB_PATH)
+    ap.add_argument("--check", action="store_true", help="periksa query plan setelah migrasi")
+    args = ap.parse_args()
+    conn = get_db(args.db)
+    print(f"Schema version {migrate(conn)}.")
+    if args.check:
+        bad = check_query_plans(conn)
+        for name, plan in bad.items():
+            print(f"FULL SCAN  {name}: {' | '.join(plan)}")
+        print("Query plans OK." if not bad else f"{len(bad)} hot query(s) not index-backed.")
+        sys.exit(1 if bad else 0)
@@ -0,0 +1,223 @@
+# backend-ai/model_store.py
+# Format model LBPH biner yang bisa di-mmap, pengganti training.xml.
+import json
+import os
+import numpy as np
+from config import MODEL_DIR, MODEL_MAX_SEGMENTS
+
+_ARRAYS = ("hist", "labels", "protos", "proto_labels")
+
+
+class ModelStore:
+    """
+    Satu generasi model = meta.json berisi daftar segmen. Segmen bersifat append-only dan tidak pernah diubah:
+    seg<s>_hist.npy (float32, N x D, diurutkan per label), seg<s>_labels.npy (int32, N), seg<s>_protos.npy
+    (float16, rata-rata histogram per label di segmen itu) dan seg<s>_proto_labels.npy.
+    Histogram disimpan float32 supaya partisi per label (slice mmap kontigu) langsung bisa dipakai cv2.compareHist
+    tanpa salinan float32 pribadi di tiap worker; segmen float16 format lama ditulis ulang saat generasi berikutnya.
+    Enroll menambah satu segmen kecil; kompaksi hanya menulis ulang segmen yang berisi label terhapus; training
+    penuh menerbitkan satu segmen baru. Generasi baru cukup menulis meta.json, bukan seluruh histogram.
+    Semua array dibuka dengan np.load(mmap_mode="r"), jadi beberapa worker berbagi page cache yang sama
+    alih-alih masing-masing mem-parse XML ke RAM pribadinya.
+    meta.json juga memuat label_map (user_id -> label) milik generasi itu, sehingga label dan histogram
+    selalu berpindah generasi bersamaan.
+    """
+    def __init__(self, root: str = MODEL_DIR, max_segments: int = MODEL_MAX_SEGMENTS):
+        self.root = root
+        self.max_segments = max_segments
+        os.makedirs(root, exist_ok=True)
+        self.meta_path = os.path.join(root, "meta.json")
+        self._stat = None
+
+    def changed(self) -> bool:
+        """True kalau meta.json berubah sejak panggilan terakhir (cukup satu stat, tanpa membaca file)."""
+        try:
+            st = os.stat(self.meta_path)
+            stat = (st.st_mtime_ns, st.st_size, st.st_ino)
+        except OSError:
+            stat = None
+        if stat == self._stat:
+            return False
+        self._stat = stat
+        return True
+
+    def meta(self) -> dict:
+        if not os.path.exists(self.meta_path):
+            return None
+        try:
+            with open(self.meta_path) as f:
+                return json.load(f)
+        except Exception:
+            return None
+
+    @staticmethod
+    def _segments(meta: dict) -> list:
+        if "segments" in meta:
+            return meta["segments"]
+        # Format lama (satu set hist_<g>.npy per generasi) dibaca sebagai satu segmen
+        return [{k: meta[k] for k in _ARRAYS}] if "hist" in meta else []
+
+    def load(self) -> dict:
+        """
+        Mengembalikan dict generasi aktif: "segments" (list dict array mmap per segmen), "labels" (int32 gabungan,
+        urutan segmen), "proto_labels"/"protos" (prototipe per label digabung lintas segmen, float16 di RAM),
+        "generation", "params" dan "label_map".
+        """
+        meta = self.meta()
+        if not meta:
+            return None
+        segments = []
+        try:
+            for seg in self._segments(meta):
+                segments.append({k: np.load(os.path.join(self.root, seg[k]), mmap_mode="r") for k in _ARRAYS})
+        except Exception as e:
+            print(f"[AI-PROCTOR] Model generation {meta.get('generation')} unreadable ({e}).")
+            return None
+        model = {
+            "segments": segments,
+            "labels": np.concatenate([np.asarray(s["labels"]) for s in segments]) if segments else np.zeros(0, np.int32),
+            "generation": int(meta["generation"]),
+            "params": meta.get("params", {}),
+            "label_map": {k: int(v) for k, v in meta.get("label_map", {}).items()},
+        }
+        model["proto_labels"], model["protos"] = self._merge_protos(segments)
+        return model
+
+    @staticmethod
+    def _merge_protos(segments: list):
+        """Rata-rata histogram per label lintas segmen, dibobot jumlah baris label itu di tiap segmen."""
+        if not segments:
+            return np.zeros(0, np.int32), np.zeros((0, 0), np.float16)
+        if len(segments) == 1:
+            return np.asarray(segments[0]["proto_labels"]), segments[0]["protos"]
+        sums, counts = {}, {}
+        for s in segments:
+            lab, cnt = np.unique(np.asarray(s["labels"]), return_counts=True)
+            for lb, c, p in zip(lab, cnt, s["protos"]):
+                lb = int(lb)
+                v = np.asarray(p, dtype=np.float32) * c
+                sums[lb] = sums[lb] + v if lb in sums else v
+                counts[lb] = counts.get(lb, 0) + int(c)
+        proto_labels = np.array(sorted(sums), dtype=np.int32)
+        protos = np.vstack([sums[lb] / counts[lb] for lb in proto_labels]).astype(np.float16)
+        return proto_labels, protos
+
+    def _write_segment(self, meta: dict, hists, labels) -> dict:
+        """Tulis satu segmen baru (histogram diurutkan per label) dan kembalikan deskriptornya."""
+        labels = np.asarray(labels, dtype=np.int32).ravel()
+        order = np.argsort(labels, kind="stable")
+        labels = labels[order]
+        hists = np.asarray(hists)[order].astype(np.float32, copy=False)
+        proto_labels, starts = np.unique(labels, return_index=True)
+        bounds = list(starts) + [len(labels)]
+        protos = np.vstack([hists[bounds[i]:bounds[i + 1]].mean(axis=0)
+                            for i in range(len(proto_labels))]).astype(np.float16)
+        sid = int(meta.get("next_segment", 1))
+        meta["next_segment"] = sid + 1
+        seg = {k: f"seg{sid}_{k}.npy" for k in _ARRAYS}
+        self._save(seg["hist"], hists)
+        self._save(seg["labels"], labels)
+        self._save(seg["protos"], protos)
+        self._save(seg["proto_labels"], proto_labels.astype(np.int32))
+        seg["rows"] = int(len(labels))
+        return seg
+
+    def _save(self, fn: str, arr):
+        # Tulis ke file sementara lalu os.replace: nama segmen bisa dipakai lagi kalau meta.json hilang, dan worker lain
+        # yang masih me-mmap file lama dengan nama itu tidak boleh melihat isinya terpotong
+        path = os.path.join(self.root, fn)
+        with open(path + ".tmp", "wb") as f:
+            np.save(f, arr)
+        os.replace(path + ".tmp", path)
+
+    def _commit(self, meta: dict, segments: list, params: dict = None, label_map: dict = None) -> dict:
+        present = set()
+        for seg in segments:
+            present.update(int(v) for v in np.load(os.path.join(self.root, seg["proto_labels"])))
+        label_map = {k: int(v) for k, v in (label_map if label_map is not None else meta.get("label_map", {})).items()
+                     if int(v) in present}
+        new_meta = {
+            "generation": int(meta.get("generation", 0)) + 1,
+            "next_segment": int(meta.get("next_segment", 1)),
+            "segments": segments,
+            "params": params or meta.get("params", {}),
+            "dtype": "float32",
+            "label_map": label_map,
+        }
+        tmp = self.meta_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(new_meta, f)
+        os.replace(tmp, self.meta_path)
+        self._cleanup({fn for seg in segments for k, fn in seg.items() if k in _ARRAYS})
+        return self.load()
+
+    def publish(self, hists, labels, params: dict = None, label_map: dict = None) -> dict:
+        """Generasi baru berisi tepat hists/labels ini sebagai satu segmen (training penuh, migrasi XML)."""
+        meta = self.meta() or {}
+        seg = self._write_segment(meta, hists, labels)
+        return self._commit(meta, [seg], params, label_map)
+
+    def append(self, hists, labels, label_map: dict = None) -> dict:
+        """Generasi baru = segmen yang ada + satu segmen berisi hists/labels; histogram lama tidak dibaca/ditulis."""
+        meta = self.meta() or {}
+        segments = [self._upgrade(meta, seg) for seg in self._segments(meta)] + [self._write_segment(meta, hists, labels)]
+        if len(segments) > self.max_segments:
+            segments = self._merge_small(meta, segments)
+        return self._commit(meta, segments, label_map=label_map)
+
+    def drop_labels(self, dead: set, label_map: dict = None):
+        """
+        Generasi baru tanpa baris milik label di `dead`. Hanya segmen yang memuat label itu yang ditulis ulang.
+        Mengembalikan (model, jumlah baris dibuang); model tanpa segmen kalau tidak ada baris tersisa.
+        """
+        meta = self.meta() or {}
+        dead = np.array(sorted(dead), dtype=np.int32)
+        segments, removed = [], 0
+        for seg in self._segments(meta):
+            plabels = np.load(os.path.join(self.root, seg["proto_labels"]))
+            if not np.isin(plabels, dead).any():
+                segments.append(self._upgrade(meta, seg))
+                continue
+            labels = np.load(os.path.join(self.root, seg["labels"]))
+            keep = ~np.isin(labels, dead)
+            removed += int((~keep).sum())
+            if keep.any():
+                hist = np.load(os.path.join(self.root, seg["hist"]), mmap_mode="r")
+                segments.append(self._write_segment(meta, hist[keep], labels[keep]))
+        return self._commit(meta, segments, label_map=label_map), removed
+
+    def _upgrade(self, meta: dict, seg: dict) -> dict:
+        """Segmen float16 (format lama) ditulis ulang sekali sebagai float32; segmen float32 dikembalikan apa adanya."""
+        hist = np.load(os.path.join(self.root, seg["hist"]), mmap_mode="r")
+        if hist.dtype == np.float32:
+            return seg
+        return self._write_segment(meta, hist, np.load(os.path.join(self.root, seg["labels"])))
+
+    def _merge_small(self, meta: dict, segments: list) -> list:
+        """
+        Terlalu banyak segmen (banyak enroll kecil): gabungkan segmen-segmen terkecil menjadi satu, sehingga jumlah
+        segmen kembali ke setengah batas. Segmen besar hasil training penuh tidak ikut ditulis ulang.
+        """
+        by_size = sorted(range(len(segments)), key=lambda i: segments[i].get("rows", 0))
+        merge = set(by_size[:len(segments) - self.max_segments // 2 + 1])
+        parts = [segments[i] for i in sorted(merge)]
+        hists = np.concatenate([np.load(os.path.join(self.root, s["hist"]), mmap_mode="r") for s in parts])
+        labels = np.concatenate([np.load(os.path.join(self.root, s["labels"])) for s in parts])
+        merged = self._write_segment(meta, hists, labels)
+        return [s for i, s in enumerate(segments) if i not in merge] + [merged]
+
+    def clear(self) -> dict:
+        """
+        Generasi baru tanpa segmen. meta.json tidak dihapus: nomor generasi tidak boleh kembali ke 1, karena worker
+        lain hanya memuat ulang model kalau nomor generasinya berbeda dari yang terakhir mereka muat.
+        """
+        return self._commit(self.meta() or {}, [], label_map={})
+
+    def _cleanup(self, keep: set):
+        # Segmen lama yang masih di-mmap worker lain gagal dihapus di Windows; dicoba lagi saat publish berikutnya
+        for fn in os.listdir(self.root):
+            if fn.endswith(".npy") and fn not in keep:
+                try:
+                    os.remove(os.path.join(self.root, fn))
+                except Exception:
+                    pass
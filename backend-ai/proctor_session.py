@@ -0,0 +1,48 @@
+# backend-ai/proctor_session.py
+# Sesi proctoring streaming: frame JPEG biner masuk, delta bbox/status keluar.
+
+
+class ProctorSession:
+    """
+    State satu sesi ujian di kanal streaming /proctor/stream.
+    Menyimpan hasil terakhir yang sudah dikirim supaya respons berikutnya cukup berisi bagian yang berubah.
+    """
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.seq = 0
+        self.dropped = 0
+        self.last_status = None
+        self.last_boxes = None
+        self.last_interval = None
+
+    @staticmethod
+    def _compact_boxes(bboxes: list) -> list:
+        # [x, y, w, h, label, conf] jauh lebih ringkas daripada dict per bbox
+        return [[b["x"], b["y"], b["w"], b["h"], b["label"], b["conf"]] for b in bboxes]
+
+    def delta(self, result: dict) -> dict:
+        self.seq += 1
+        msg = {"seq": self.seq}
+        if "error" in result:
+            msg["error"] = result["error"]
+            if "retry_after_ms" in result:
+                msg["retry_after_ms"] = result["retry_after_ms"]
+                self.last_interval = None  # klien memperpanjang jeda; kirim ulang interval normal setelah ini
+            return msg
+
+        boxes = self._compact_boxes(result.get("bboxes", []))
+        if boxes != self.last_boxes:
+            msg["bboxes"] = boxes
+            self.last_boxes = boxes
+        status = result.get("status")
+        if status != self.last_status:
+            msg["status"] = status
+            self.last_status = status
+        interval = result.get("next_interval_ms")
+        if interval is not None and interval != self.last_interval:
+            msg["next_interval_ms"] = interval
+            self.last_interval = interval
+        if self.dropped:
+            msg["dropped"] = self.dropped
+            self.dropped = 0
+        return msg
@@ -0,0 +1,81 @@
+# backend-ai/progress_writer.py
+# Penulisan course_progress: upsert batch (executemany, satu transaksi) + buffer coalescing untuk update posisi video.
+import atexit
+import os
+import threading
+import time
+from config import PROGRESS_FLUSH_INTERVAL
+from db import get_db
+
+UPSERT_SQL = """
+    INSERT INTO course_progress (user_id, module_title, lesson_index, lesson_title, completed, last_position, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(user_id, module_title, lesson_index) DO UPDATE SET
+        lesson_title=excluded.lesson_title,
+        completed=excluded.completed,
+        last_position=excluded.last_position,
+        updated_at=excluded.updated_at
+"""
+
+# Versi untuk buffer: update posisi yang tertunda tidak boleh membatalkan status completed yang sudah tertulis
+COALESCED_UPSERT_SQL = UPSERT_SQL.replace("completed=excluded.completed", "completed=MAX(completed, excluded.completed)")
+
+
+def upsert_progress(conn, records: list):
+    """records: [(user_id, module_title, lesson_index, lesson_title, completed, last_position, updated_at)]"""
+    conn.executemany(UPSERT_SQL, records)
+
+
+class ProgressWriter:
+    """
+    Update last_position yang datang beruntun untuk (user, modul, lesson) yang sama cukup disimpan versi terakhirnya,
+    lalu ditulis sekaligus setiap PROGRESS_FLUSH_INTERVAL detik oleh satu thread background.
+    Penulisan langsung (completed / batch) membuang entri buffer yang lebih lama untuk kunci yang sama.
+    """
+    def __init__(self, interval: float = PROGRESS_FLUSH_INTERVAL):
+        self.interval = interval
+        self._start()
+        atexit.register(self.flush)
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._start)
+
+    def _start(self):
+        # Juga dipanggil di proses hasil fork (serve.py): thread flush milik induk tidak ikut ter-fork
+        self._lock = threading.Lock()
+        self._pending = {}
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def buffer(self, record: tuple):
+        with self._lock:
+            self._pending[record[:3]] = record
+
+    def write(self, conn, records: list):
+        """Tulis langsung di transaksi milik pemanggil (caller yang commit)."""
+        with self._lock:
+            for r in records:
+                self._pending.pop(r[:3], None)
+        upsert_progress(conn, records)
+
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def flush(self) -> int:
+        with self._lock:
+            records, self._pending = list(self._pending.values()), {}
+        if not records:
+            return 0
+        try:
+            with get_db() as conn:
+                conn.executemany(COALESCED_UPSERT_SQL, records)
+        except Exception as e:
+            print(f"[ERROR] Progress flush failed ({len(records)} record(s)): {e}")
+            with self._lock:
+                for r in records:
+                    self._pending.setdefault(r[:3], r)
+            return 0
+        return len(records)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
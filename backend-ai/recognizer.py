@@ -3,11 +3,26 @@ import os
 import numpy as np
 import base64
 import tempfile
-from config import DATASET_DIR, TRAINING_MODEL, HAAR_FACE
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from arcface_loader import ArcFaceLoader
+from config import (DATASET_DIR, TRAINING_MODEL, HAAR_FACE, DETECT_WIDTH, EMBED_BATCH_SIZE, MODEL_RELOAD_INTERVAL,
+                    SESSION_TTL, SESSION_MAX)
+from embedding_index import EmbeddingIndex
+from embedding_store import EmbeddingStore
+from face_store import FaceStore, migrate as migrate_face_store
+from enrollment import extract_video_crops
+from label_registry import LabelRegistry
+from model_store import ModelStore
+from tracker import FaceTracker, frame_hash
+from verification import VerificationEngine
 try:
-    from deepface import DeepFace
-except Exception:
-    DeepFace = None
+    import fcntl
+except ImportError:  # Windows: tidak ada mode multi-worker, cukup kunci antar-thread
+    fcntl = None
 
 class FaceProctor:
     """
@@ -18,49 +33,105 @@ class FaceProctor:
         self.face_cascade = cv2.CascadeClassifier(HAAR_FACE)
         if self.face_cascade.empty():
             raise Exception(f"ERROR: haarcascade_frontalface_default.xml not found at {HAAR_FACE} or corrupted!")
+        self.detect_width = DETECT_WIDTH
 
-        self.recognizer = cv2.face.LBPHFaceRecognizer_create(
-            radius=2,
-            neighbors=8,
-            grid_x=8,
-            grid_y=8,
-            threshold=65.0
-        )
-
-        self.label_map = self._get_current_label_map()
-        self.df_model = None
-        self.user_embeddings = {}
-        if DeepFace is not None:
-            try:
-                self.df_model = DeepFace.build_model('ArcFace')
-            except Exception:
-                self.df_model = None
+        self.model_store = ModelStore()
+        self.model = None
+        self.verifier = VerificationEngine()
+        self.model_ready = False
+        self._train_lock = threading.Lock()
+        self.on_publish = None  # dipanggil setelah model/indeks ditulis (serve.py: beri tahu worker lain)
 
-        if os.path.exists(TRAINING_MODEL):
-            try:
-                self.recognizer.read(TRAINING_MODEL)
-                print(f"[AI-PROCTOR] Model loaded successfully: {TRAINING_MODEL} for {len(self.label_map)} user(s).")
-            except Exception as e:
-                print(f"[AI-PROCTOR] Existing model corrupted ({e}). A new one will be created after training.")
+        os.makedirs(DATASET_DIR, exist_ok=True)
+        self.face_store = FaceStore()
+        if not self.face_store.users():
+            migrate_face_store(DATASET_DIR, self.face_store)
+        self.labels = LabelRegistry()
+        self.label_map = {}
+        self.label_rev = {}
+        self._next_reload = 0.0
+        self.arcface = ArcFaceLoader()  # dimulai lewat warm_up() / request pertama, bukan saat import
+        self.embedding_index = EmbeddingIndex()
+        self.embedding_store = EmbeddingStore()
+        ids, matrix, centroids = self.embedding_store.load_index()
+        if ids:
+            self.embedding_index.set_all(ids, matrix, centroids)
+        # State per sesi ujian (frame terakhir untuk preview, tracker); dibuang saat sesi ditutup, setelah
+        # SESSION_TTL detik tanpa frame, atau saat lebih dari SESSION_MAX sesi (yang paling lama diam)
+        self.last_frames = {}
+        self.trackers = {}
+        self._sessions = OrderedDict()
+        self._session_lock = threading.Lock()
+        model = self.model_store.load()
+        if model is None and os.path.exists(TRAINING_MODEL):
+            model = self._migrate_xml_model()
+        if model is not None:
+            if not model["label_map"] and len(model["labels"]):
+                model["label_map"] = self._bootstrap_labels(model)
+            self._set_model(model)
+            self.model_store.changed()
+            print(f"[AI-PROCTOR] Model generation {model['generation']} loaded for {len(self.label_map)} user(s).")
         else:
             print("[AI-PROCTOR] No trained model found. It will be created after training.")
 
-        os.makedirs(DATASET_DIR, exist_ok=True)
+    @property
+    def df_model(self):
+        """Model ArcFace kalau sudah hangat, selain itu None (tidak menunggu)."""
+        return self.arcface.get()[1]
+
+    def warm_up(self):
+        self.arcface.start()
 
-    def _get_current_label_map(self):
-        label_map = {}
-        lid = 0
-        for uf in sorted(os.listdir(DATASET_DIR)):
-            if os.path.isdir(os.path.join(DATASET_DIR, uf)):
-                label_map[uf] = lid
-                lid += 1
-        return label_map
+    def _migrate_xml_model(self):
+        """Konversi satu kali training.xml lama ke format biner ModelStore."""
+        try:
+            recognizer = self._new_recognizer()
+            recognizer.read(TRAINING_MODEL)
+            hists = recognizer.getHistograms()
+            if not hists:
+                return None
+            model = self.model_store.publish(np.vstack(hists), recognizer.getLabels(), self._model_params())
+            print(f"[AI-PROCTOR] Migrated {TRAINING_MODEL} to binary model format.")
+            return model
+        except Exception as e:
+            print(f"[AI-PROCTOR] Existing model corrupted ({e}). A new one will be created after training.")
+            return None
 
-    def enroll(self, user_id: str, video_b64: str) -> tuple[bool, int]:
-        folder = os.path.join(DATASET_DIR, user_id)
-        os.makedirs(folder, exist_ok=True)
+    @staticmethod
+    def _new_recognizer():
+        return cv2.face.LBPHFaceRecognizer_create(
+            radius=2,
+            neighbors=8,
+            grid_x=8,
+            grid_y=8,
+            threshold=65.0
+        )
 
-        total = 0
+    @staticmethod
+    def _model_params() -> dict:
+        return {"radius": 2, "neighbors": 8, "grid_x": 8, "grid_y": 8, "threshold": 65.0}
+
+    def _histograms(self, faces: list):
+        """Histogram LBPH (N x D float32) dihitung oleh OpenCV untuk sekumpulan crop."""
+        recognizer = self._new_recognizer()
+        recognizer.train(faces, np.zeros(len(faces), dtype=np.int32))
+        return np.vstack(recognizer.getHistograms())
+
+    def _bootstrap_labels(self, model) -> dict:
+        """Label map untuk model tanpa label_map di meta.json (hasil migrasi training.xml)."""
+        # Model lama (sebelum ada registry) memakai urutan sorted(os.listdir(DATASET_DIR)) sebagai label id
+        if not self.labels.labels:
+            for uf in self.face_store.users():
+                self.labels.get_or_assign(uf)
+                self.labels.trained[uf] = self.face_store.count(uf)
+            self.labels.save()
+        present = set(int(v) for v in model["proto_labels"])
+        return {k: v for k, v in self.labels.active().items() if v in present}
+
+    MIN_ENROLL_FACES = 30
+
+    def extract_faces(self, user_id: str, video_b64: str) -> int:
+        """Simpan crop wajah dari video/gambar enroll ke FaceStore tanpa training. Mengembalikan jumlah crop user."""
         try:
             if ',' in video_b64:
                 video_b64 = video_b64.split(',')[1]
@@ -74,138 +145,349 @@ class FaceProctor:
         except Exception:
             img = None
 
+        crops = []
         if img is not None:
             gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            faces = self.face_cascade.detectMultiScale(gray, 1.2, 6, minSize=(100, 100))
+            faces = self._detect(gray, 100)
             if len(faces) > 0:
                 x, y, w, h = faces[0]
-                face_roi = cv2.resize(gray[y:y+h, x:x+w], (200, 200))
-                filename = os.path.join(folder, f"{user_id}_{len(os.listdir(folder))+1:04d}.jpg")
-                cv2.imwrite(filename, face_roi)
-                total += 1
+                crops.append(cv2.resize(gray[y:y+h, x:x+w], (200, 200)))
         else:
             with tempfile.NamedTemporaryFile(delete=False, suffix='.webm') as tmp:
                 tmp.write(video_bytes)
                 tmp_path = tmp.name
-            cap = cv2.VideoCapture(tmp_path)
-            frame_count = 0
-            target = 120
-            while cap.isOpened() and total < target:
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                if frame_count % 3 == 0:
-                    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                    faces = self.face_cascade.detectMultiScale(gray, 1.2, 6, minSize=(80, 80))
-                    for (x, y, w, h) in faces:
-                        if total >= target:
-                            break
-                        face_roi = cv2.resize(gray[y:y+h, x:x+w], (200, 200))
-                        filename = os.path.join(folder, f"{user_id}_{len(os.listdir(folder))+1:04d}.jpg")
-                        cv2.imwrite(filename, face_roi)
-                        total += 1
-                frame_count += 1
-            cap.release()
             try:
-                os.remove(tmp_path)
+                crops = extract_video_crops(tmp_path, lambda g: self._detect(g, 80), target=120, min_keep=self.MIN_ENROLL_FACES)
+            finally:
+                try:
+                    os.remove(tmp_path)
+                except Exception:
+                    pass
+
+        return self.face_store.append(user_id, crops)
+
+    def _publish(self, hists, labels):
+        """Tulis generasi model baru lalu tukar referensinya; verify yang sedang jalan tetap memakai generasi lama."""
+        model = self.model_store.publish(hists, labels, self._model_params(), self.labels.active())
+        self._set_model(model)
+
+    def _set_model(self, model):
+        self.verifier.load(model)
+        self.label_map = dict(model["label_map"]) if model else {}
+        self.label_rev = {v: k for k, v in self.label_map.items()}
+        self.model = model
+        self.model_ready = model is not None and len(model["labels"]) > 0
+
+    def refresh_model(self):
+        """
+        Hot-reload saat proses lain menerbitkan generasi model / indeks embedding baru. Dibatasi sekali per
+        MODEL_RELOAD_INTERVAL dan hanya beberapa stat; label map tidak pernah dibaca ulang di luar pergantian generasi.
+        """
+        now = time.monotonic()
+        if now < self._next_reload:
+            return
+        self._next_reload = now + MODEL_RELOAD_INTERVAL
+        if not self._train_lock.acquire(blocking=False):
+            return
+        try:
+            if self.model_store.changed():
+                self._sync_model()
+            if self.embedding_store.changed():
+                self._reload_embeddings()
+        finally:
+            self._train_lock.release()
+
+    def schedule_reload(self):
+        """Cek generasi model/indeks di request berikutnya tanpa menunggu MODEL_RELOAD_INTERVAL (sinyal dari serve.py)."""
+        self._next_reload = 0.0
+
+    def _sync_model(self):
+        meta = self.model_store.meta()
+        current = self.model["generation"] if self.model else None
+        gen = int(meta["generation"]) if meta else None
+        if gen == current:
+            return
+        model = self.model_store.load() if meta else None
+        if model is None and meta:
+            return
+        self.labels = LabelRegistry()
+        self._set_model(model)
+        print(f"[AI-PROCTOR] Hot-reloaded model generation {gen}.")
+
+    def _reload_embeddings(self):
+        self.embedding_store = EmbeddingStore()
+        ids, matrix, centroids = self.embedding_store.load_index()
+        self.embedding_index.set_all(ids, matrix, centroids)
+
+    @contextmanager
+    def _writer(self):
+        """
+        Kunci untuk semua operasi yang menulis model/label/embedding: antar-thread (_train_lock) dan antar-proses
+        (flock pada MODEL_DIR/.train.lock) untuk mode multi-worker serve.py. State disinkronkan dari disk dulu,
+        supaya training tidak dibangun di atas generasi lama dan menimpa hasil worker lain.
+        """
+        with self._train_lock:
+            fd = None
+            if fcntl is not None:
+                fd = os.open(os.path.join(self.model_store.root, ".train.lock"), os.O_CREAT | os.O_RDWR)
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                self._sync_model()
+                self.labels = LabelRegistry()
+                if self.embedding_store.changed():
+                    self._reload_embeddings()
+                yield
+            finally:
+                if fd is not None:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+                    os.close(fd)
+                if self.on_publish is not None:
+                    try:
+                        self.on_publish()
+                    except Exception:
+                        pass
+
+    def _load_crops(self, user_id: str) -> list:
+        """Pasangan (hash, crop) milik user; crop adalah view zero-copy dari np.memmap FaceStore."""
+        return list(zip(self.face_store.hashes(user_id), self.face_store.load(user_id)))
+
+    def _embed_batch(self, imgs: list):
+        """
+        Embedding ArcFace untuk crop 200x200 yang sudah ada di memori, dalam satu forward pass.
+        Crop sudah berupa wajah, jadi deteksi ulang DeepFace dilewati; grayscale diduplikasi ke 3 kanal.
+        """
+        model = getattr(self.df_model, 'model', None)
+        if model is not None and getattr(model, 'input_shape', None):
+            h, w = model.input_shape[1:3]
+            batch = np.stack([cv2.resize(cv2.cvtColor(g, cv2.COLOR_GRAY2RGB), (w, h)) for g in imgs]).astype(np.float32) / 255.0
+            return np.asarray(model(batch, training=False), dtype=np.float32)
+        vecs = []
+        for g in imgs:
+            rep = self.arcface.DeepFace.represent(img_path=cv2.cvtColor(g, cv2.COLOR_GRAY2BGR), model_name='ArcFace', model=self.df_model, enforce_detection=False, detector_backend='skip')
+            vecs.append(rep[0]['embedding'] if isinstance(rep, list) else rep['embedding'])
+        return np.array(vecs, dtype=np.float32)
+
+    def _user_embedding(self, crops: list, seen: set = None):
+        """
+        Rata-rata embedding ArcFace dari crop milik satu user, atau None kalau DeepFace tidak tersedia.
+        Embedding per crop diambil dari EmbeddingStore (kunci = hash isi file); hanya crop baru yang dihitung,
+        dalam batch berukuran EMBED_BATCH_SIZE.
+        """
+        if self.df_model is None:
+            return None
+        embs = []
+        missing = []
+        for key, img in crops:
+            if seen is not None:
+                seen.add(key)
+            vec = self.embedding_store.get(key)
+            if vec is None:
+                missing.append((key, img))
+            else:
+                embs.append(vec)
+        for i in range(0, len(missing), EMBED_BATCH_SIZE):
+            chunk = missing[i:i + EMBED_BATCH_SIZE]
+            try:
+                vecs = self._embed_batch([img for _, img in chunk])
+            except Exception as e:
+                print(f"[AI-PROCTOR] Embedding batch failed: {e}")
+                continue
+            for (key, _), vec in zip(chunk, vecs):
+                self.embedding_store.add(key, vec)
+                embs.append(vec)
+        if len(embs) > 0:
+            try:
+                return np.mean(np.vstack(embs), axis=0)
             except Exception:
                 pass
+        return None
 
-        total_files = len([f for f in os.listdir(folder) if f.lower().endswith(('.jpg', '.jpeg', '.png'))])
-        min_req = 30
-        if total_files >= min_req:
-            ok = self.train_model()
-            return ok, total_files
-        return False, total_files
+    def _save_embedding_index(self):
+        try:
+            self.embedding_store.save_index(*self.embedding_index.snapshot())
+        except Exception as e:
+            print(f"[AI-PROCTOR] Failed to persist embedding index: {e}")
 
     def train_model(self) -> bool:
+        """Training ulang penuh dari seluruh user di FaceStore (POST /train)."""
+        self.arcface.wait()  # di luar lock: training pertama setelah start menunggu ArcFace, bukan request lain
+        with self._writer():
+            return self._train_full()
+
+    def _train_full(self) -> bool:
         faces = []
         labels = []
-
-        self.label_map = self._get_current_label_map()
+        trained = {}
+        embeddings = {}
+        seen = set()
+
+        folders = self.face_store.users()
+        for uid in list(self.labels.labels):
+            if uid not in folders:
+                self.labels.remove(uid)
         print("[AI-PROCTOR] Starting model training with all registered users...")
 
-        for user_folder, label_id in self.label_map.items():
-            folder_path = os.path.join(DATASET_DIR, user_folder)
-            embs = []
-            for filename in os.listdir(folder_path):
-                if filename.lower().endswith(('.jpg', '.jpeg', '.png')):
-                    img_path = os.path.join(folder_path, filename)
-                    img = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
-                    if img is not None:
-                        img = cv2.resize(img, (200, 200))
-                        faces.append(img)
-                        labels.append(label_id)
-                        if self.df_model is not None and DeepFace is not None:
-                            try:
-                                rep = DeepFace.represent(img_path=img_path, model_name='ArcFace', model=self.df_model, enforce_detection=False, detector_backend='opencv')
-                                vec = rep[0]['embedding'] if isinstance(rep, list) else rep['embedding']
-                                embs.append(np.array(vec, dtype=np.float32))
-                            except Exception:
-                                pass
-            if len(embs) > 0:
-                try:
-                    mean_vec = np.mean(np.vstack(embs), axis=0)
-                    self.user_embeddings[user_folder] = mean_vec
-                except Exception:
-                    pass
+        # Embedding ArcFace berjalan di thread terpisah sementara thread ini lanjut membaca crop user berikutnya
+        pool = ThreadPoolExecutor(max_workers=1) if self.df_model is not None else None
+        pending = {}
+        for user_folder in folders:
+            label_id = self.labels.get_or_assign(user_folder)
+            crops = self._load_crops(user_folder)
+            faces.extend(img for _, img in crops)
+            labels.extend([label_id] * len(crops))
+            trained[user_folder] = len(crops)
+            if pool is not None:
+                pending[user_folder] = pool.submit(self._user_embedding, crops, seen)
+        if pool is not None:
+            for user_folder, fut in pending.items():
+                mean_vec = fut.result()
+                if mean_vec is not None:
+                    embeddings[user_folder] = mean_vec
+            pool.shutdown()
 
         if len(faces) < 1:
             print(f"[ERROR] Insufficient training data: only {len(faces)} images found. Need at least 1.")
             return False
 
         try:
-            self.recognizer.train(faces, np.array(labels))
-            self.recognizer.write(TRAINING_MODEL)
+            hists = self._histograms(faces)
+            self.labels.tombstones.clear()
+            self.labels.trained = trained
+            self.labels.save()
+            self._publish(hists, labels)
+            if self.df_model is not None:
+                self.embedding_index.set_all(list(embeddings), list(embeddings.values()))
+                self.embedding_store.flush(keep=seen)
+                self._save_embedding_index()
             print(f"[AI-PROCTOR] Training successful! Model saved with {len(faces)} images from {len(self.label_map)} user(s).")
             return True
         except Exception as e:
             print(f"[ERROR] Training failed: {e}")
             return False
 
-    def verify(self, image_b64: str, user_id: str) -> dict:
+    def train_incremental(self, user_id: str) -> bool:
+        """
+        Tambahkan hanya histogram crop baru milik user_id ke model, tanpa membaca ulang user lain.
+        Jatuh ke training penuh kalau belum ada model sama sekali.
+        """
+        self.arcface.wait()
+        with self._writer():
+            if not self.model_ready:
+                return self._train_full()
+
+            crops = self._load_crops(user_id)
+            faces = [img for _, img in crops[self.labels.trained.get(user_id, 0):]]
+            if not faces:
+                return len(crops) > 0
+
+            try:
+                # Generasi baru = segmen lama apa adanya + satu segmen berisi histogram crop baru
+                label_id = self.labels.get_or_assign(user_id)
+                hists = self._histograms(faces)
+                self.labels.trained[user_id] = len(crops)
+                self.labels.save()
+                self._set_model(self.model_store.append(hists, np.full(len(faces), label_id, dtype=np.int32),
+                                                        self.labels.active()))
+                mean_vec = self._user_embedding(crops)
+                if mean_vec is not None:
+                    self.embedding_index.upsert(user_id, mean_vec)
+                    self.embedding_store.flush()
+                    self._save_embedding_index()
+                print(f"[AI-PROCTOR] Incremental update: {len(faces)} new image(s) for {user_id}.")
+                return True
+            except Exception as e:
+                print(f"[ERROR] Incremental update failed: {e}")
+                return False
+
+    def remove_user(self, user_id: str):
+        """Tandai label user sebagai tombstone; histogramnya dibuang oleh kompaksi di background."""
+        with self._writer():
+            self.face_store.remove(user_id)
+            label = self.labels.remove(user_id)
+            if user_id in self.embedding_index.ids():
+                self.embedding_index.remove(user_id)
+                self._save_embedding_index()
+            if label is None:
+                return
+            self.labels.save()
+            # Sampai kompaksi menerbitkan generasi baru, user yang dihapus cukup dikeluarkan dari label map aktif
+            self.label_map = {k: v for k, v in self.label_map.items() if k != user_id}
+            self.label_rev = {v: k for k, v in self.label_map.items()}
+        threading.Thread(target=self.compact, daemon=True).start()
+
+    def compact(self):
+        """Terbitkan generasi model tanpa histogram milik label tombstone; hanya segmen yang memuat label itu ditulis ulang."""
+        with self._writer():
+            dead = set(self.labels.tombstones)
+            if not dead or not self.model_ready:
+                return
+            model, removed = self.model_store.drop_labels(dead, self.labels.active())
+            self._set_model(model)
+
+            self.labels.tombstones -= dead
+            self.labels.save()
+            print(f"[AI-PROCTOR] Compaction removed {removed} histogram(s) of {len(dead)} deleted user(s).")
+
+    @staticmethod
+    def decode_b64(image_b64: str):
+        """Byte gambar dari data URL / base64, atau None kalau tidak valid."""
         try:
             if ',' in image_b64:
                 image_b64 = image_b64.split(',')[1]
-            img_bytes = base64.b64decode(image_b64)
+            return base64.b64decode(image_b64) or None
         except Exception:
+            return None
+
+    def verify(self, image_b64: str, user_id: str, preview: bool = True) -> dict:
+        img_bytes = self.decode_b64(image_b64)
+        if img_bytes is None:
             return {"error": "Invalid image format or decoding failed"}
+        return self.verify_bytes(img_bytes, user_id, preview)
+
+    def verify_bytes(self, img_bytes: bytes, user_id: str, preview: bool = False) -> dict:
+        """
+        Verifikasi dari byte JPEG/PNG mentah (dipakai langsung oleh kanal streaming tanpa base64).
+        Anotasi + encode JPEG hanya dikerjakan kalau preview=True; selain itu frame terakhir disimpan
+        apa adanya agar reviewer bisa meminta thumbnail lewat render_preview().
+        """
+        tracker = self._session(user_id)
+        self.refresh_model()
+        expected_label = self.label_map.get(user_id, -1)
+
+        # Frame hampir identik dengan frame sebelumnya (kandidat diam): pakai ulang hasilnya tanpa deteksi
+        fhash = frame_hash(img_bytes)
+        key = (self.model["generation"] if self.model else None, expected_label)
+        cached = tracker.cached(fhash, key) if fhash is not None and not preview else None
+        if cached is not None:
+            self.last_frames[user_id] = (img_bytes, cached["bboxes"])
+            return dict(cached, cached=True)
 
         img = cv2.imdecode(np.frombuffer(img_bytes, np.uint8), cv2.IMREAD_COLOR)
         if img is None:
             return {"error": "Failed to decode image from bytes"}
 
         gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        faces = self.face_cascade.detectMultiScale(gray, 1.2, 6, minSize=(100, 100))
+        faces = self._track_faces(gray, tracker)
 
         bboxes = []
         valid_user_count = 0
         intruder_count = 0
-
-        expected_label = self._get_current_label_map().get(user_id, -1)
         CONFIDENCE_THRESHOLD_LBPH = 65
 
         for (x, y, w, h) in faces:
             face_roi = cv2.resize(gray[y:y+h, x:x+w], (200, 200))
+            # 1:1 terhadap histogram user yang diklaim saja, bukan predict() 1:N ke semua user
             try:
-                label, confidence = self.recognizer.predict(face_roi)
-                confidence = float(confidence)
+                matched, confidence = self.verifier.verify(face_roi, expected_label, CONFIDENCE_THRESHOLD_LBPH)
             except Exception:
-                label = -1
-                confidence = 999.0
+                matched, confidence = False, 999.0
 
-            if label == expected_label and confidence < CONFIDENCE_THRESHOLD_LBPH:
+            if matched:
                 status = "user"
                 valid_user_count += 1
-                color = (0, 255, 0)
             else:
                 status = "intruder"
                 intruder_count += 1
-                color = (0, 0, 255)
-
-            cv2.rectangle(img, (x, y), (x+w, y+h), color, 3)
-            cv2.putText(img, status.upper(), (x, y-10), cv2.FONT_HERSHEY_DUPLEX, 1.0, color, 2)
-            cv2.putText(img, f"Conf: {confidence:.0f}", (x, y+h+30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
 
             bboxes.append({
                 "x": int(x), "y": int(y), "w": int(w), "h": int(h),
@@ -220,59 +502,159 @@ class FaceProctor:
             overall = "intruder"
         else:
             overall = "warning"
+        tracker.set_status(overall)
 
-        _, buffer = cv2.imencode('.jpg', img, [int(cv2.IMWRITE_JPEG_QUALITY), 85])
-        preview = f"data:image/jpeg;base64,{base64.b64encode(buffer).decode()}"
+        self.last_frames[user_id] = (img_bytes, bboxes)
 
-        return {
+        result = {
             "bboxes": bboxes,
             "status": overall,
-            "preview": preview
         }
+        if fhash is not None:
+            tracker.remember(fhash, key, dict(result))
+        if preview:
+            self._annotate(img, bboxes)
+            _, buffer = cv2.imencode('.jpg', img, [int(cv2.IMWRITE_JPEG_QUALITY), 85])
+            result["preview"] = f"data:image/jpeg;base64,{base64.b64encode(buffer).decode()}"
+        return result
+
+    def _track_faces(self, gray, tracker: FaceTracker) -> list:
+        scale = self._detect_scale(gray)
+        if not tracker.needs_full_detect():
+            faces = []
+            for (rx, ry, rw, rh), (pw, ph) in tracker.windows(gray.shape):
+                roi = gray[ry:ry+rh, rx:rx+rw]
+                min_side = max(100, int(min(pw, ph) * 0.7))
+                max_side = int(max(pw, ph) * 1.4)
+                found = self._detect(roi, min_side, max_side, scale)
+                if len(found) == 0:
+                    faces = None
+                    break
+                x, y, w, h = max(found, key=lambda f: f[2] * f[3])
+                faces.append((rx + x, ry + y, w, h))
+            if faces is not None:
+                tracker.advance(faces)
+                return faces
+
+        faces = self._detect(gray, 100, scale=scale)
+        tracker.reset(faces)
+        return faces
+
+    def _detect_scale(self, gray) -> float:
+        w = gray.shape[1]
+        if self.detect_width and w > self.detect_width:
+            return self.detect_width / float(w)
+        return 1.0
+
+    def _detect(self, gray, min_side: int, max_side: int = None, scale: float = None) -> list:
+        """
+        Haar detectMultiScale pada versi gray yang diperkecil, lalu bbox dipetakan kembali ke koordinat asli.
+        Crop ROI untuk LBPH tetap diambil dari frame resolusi penuh oleh pemanggil.
+        """
+        if scale is None:
+            scale = self._detect_scale(gray)
+        small = gray
+        if scale < 1.0:
+            small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        kwargs = {"minSize": (max(24, int(min_side * scale)),) * 2}
+        if max_side:
+            kwargs["maxSize"] = (int(max_side * scale),) * 2
+        found = self.face_cascade.detectMultiScale(small, 1.2, 6, **kwargs)
+        if scale >= 1.0:
+            return [tuple(int(v) for v in f) for f in found]
+        inv = 1.0 / scale
+        H, W = gray.shape[:2]
+        faces = []
+        for (x, y, w, h) in found:
+            x0, y0 = int(round(x * inv)), int(round(y * inv))
+            faces.append((x0, y0, min(int(round(w * inv)), W - x0), min(int(round(h * inv)), H - y0)))
+        return faces
+
+    def _annotate(self, img, bboxes: list, scale: float = 1.0):
+        for b in bboxes:
+            x, y = int(b["x"] * scale), int(b["y"] * scale)
+            w, h = int(b["w"] * scale), int(b["h"] * scale)
+            color = (0, 255, 0) if b["label"] == "user" else (0, 0, 255)
+            thick = max(1, int(round(2 * scale)))
+            cv2.rectangle(img, (x, y), (x+w, y+h), color, thick + 1)
+            cv2.putText(img, b["label"].upper(), (x, y-10), cv2.FONT_HERSHEY_DUPLEX, 1.0 * scale, color, thick)
+            cv2.putText(img, f"Conf: {b['conf']:.0f}", (x, y+h+int(30 * scale)), cv2.FONT_HERSHEY_SIMPLEX, 0.8 * scale, color, thick)
+
+    def _session(self, user_id: str):
+        """Tandai sesi user_id aktif, buang sesi kedaluwarsa/terlama, dan kembalikan tracker-nya."""
+        now = time.monotonic()
+        with self._session_lock:
+            self._sessions[user_id] = now
+            self._sessions.move_to_end(user_id)
+            while self._sessions:
+                uid, seen = next(iter(self._sessions.items()))
+                if len(self._sessions) <= SESSION_MAX and now - seen < SESSION_TTL:
+                    break
+                self._sessions.popitem(last=False)
+                self.last_frames.pop(uid, None)
+                self.trackers.pop(uid, None)
+            tracker = self.trackers.get(user_id)
+            if tracker is None:
+                tracker = self.trackers[user_id] = FaceTracker()
+        return tracker
+
+    def end_session(self, user_id: str):
+        """Sesi ujian ditutup (WebSocket putus): lepaskan frame terakhir dan tracker-nya."""
+        with self._session_lock:
+            self._sessions.pop(user_id, None)
+            self.last_frames.pop(user_id, None)
+            self.trackers.pop(user_id, None)
+
+    def render_preview(self, user_id: str, width: int = 320):
+        """Thumbnail beranotasi dari frame terakhir sesi user_id, dibuat hanya saat diminta reviewer."""
+        entry = self.last_frames.get(user_id)
+        seen = self._sessions.get(user_id)
+        if entry is None or seen is None or time.monotonic() - seen >= SESSION_TTL:
+            return None
+        img_bytes, bboxes = entry
+        img = cv2.imdecode(np.frombuffer(img_bytes, np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            return None
+        scale = min(1.0, width / float(img.shape[1]))
+        if scale < 1.0:
+            img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        self._annotate(img, bboxes, scale)
+        _, buffer = cv2.imencode('.jpg', img, [int(cv2.IMWRITE_JPEG_QUALITY), 75])
+        return buffer.tobytes()
 
     def identify(self, image_b64: str) -> dict:
-        try:
-            if ',' in image_b64:
-                image_b64 = image_b64.split(',')[1]
-            img_bytes = base64.b64decode(image_b64)
-        except Exception:
+        img_bytes = self.decode_b64(image_b64)
+        if img_bytes is None:
             return {"success": False, "error": "decode_failed"}
 
         img = cv2.imdecode(np.frombuffer(img_bytes, np.uint8), cv2.IMREAD_COLOR)
         if img is None:
             return {"success": False, "error": "imdecode_failed"}
 
-        if self.df_model is not None and len(self.user_embeddings) > 0 and DeepFace is not None:
+        # ArcFace belum hangat: langsung jatuh ke LBPH di bawah daripada menahan login
+        DeepFace, df_model = self.arcface.get()
+        if df_model is not None and len(self.embedding_index) > 0:
             try:
-                rep = DeepFace.represent(img_path=img, model_name='ArcFace', model=self.df_model, enforce_detection=False, detector_backend='opencv')
+                rep = DeepFace.represent(img_path=img, model_name='ArcFace', model=df_model, enforce_detection=False, detector_backend='opencv')
                 vec = rep[0]['embedding'] if isinstance(rep, list) else rep['embedding']
-                v = np.array(vec, dtype=np.float32)
-                best_uid = None
-                best_dist = None
-                for uid, mean_vec in self.user_embeddings.items():
-                    a = v / (np.linalg.norm(v) + 1e-8)
-                    b = mean_vec / (np.linalg.norm(mean_vec) + 1e-8)
-                    d = 1.0 - float(np.dot(a, b))
-                    if best_dist is None or d < best_dist:
-                        best_dist = d
-                        best_uid = uid
-                if best_uid is not None and best_dist is not None and best_dist < 0.4:
+                hits = self.embedding_index.search(np.array(vec, dtype=np.float32), k=1)
+                if hits and hits[0][1] < 0.4:
+                    best_uid, best_dist = hits[0]
                     return {"success": True, "user_id": best_uid, "distance": best_dist}
             except Exception:
                 pass
 
         gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        faces = self.face_cascade.detectMultiScale(gray, 1.2, 6, minSize=(100, 100))
+        faces = self._detect(gray, 100)
         if len(faces) == 0:
             return {"success": False, "error": "no_face"}
-        lm = self._get_current_label_map()
-        rev = {v: k for k, v in lm.items()}
+        self.refresh_model()
+        rev = self.label_rev
         best = None
         for (x, y, w, h) in faces:
             face_roi = cv2.resize(gray[y:y+h, x:x+w], (200, 200))
             try:
-                label, confidence = self.recognizer.predict(face_roi)
-                confidence = float(confidence)
+                label, confidence = self.verifier.identify(face_roi, 65.0)
             except Exception:
                 label, confidence = -1, 999.0
             if best is None or confidence < best[1]:
@@ -0,0 +1,110 @@
+# backend-ai/serve.py
+# Entry point produksi (Linux/macOS): app, Haar cascade dan model mmap dimuat sekali di proses induk, lalu
+# di-fork menjadi N worker yang berbagi socket listen dan halaman memori (copy-on-write).
+# Jalankan: python serve.py --workers 4 --port 5000
+import argparse
+import os
+import signal
+import socket
+import sys
+import time
+from werkzeug.serving import make_server
+
+
+def _run_worker(app, proctor, fd: int):
+    # Worker lain menerbitkan generasi baru -> induk meneruskan SIGUSR1 -> cek meta.json di request berikutnya
+    signal.signal(signal.SIGUSR1, lambda *_: proctor.schedule_reload())
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    parent = os.getppid()
+    proctor.on_publish = lambda: os.kill(parent, signal.SIGUSR1)
+    proctor.warm_up()  # ArcFace/TensorFlow dimuat per worker setelah fork, tidak di induk
+    server = make_server("", 0, app, threaded=True, fd=fd)
+    server.serve_forever()
+
+
+def serve(host: str = "127.0.0.1", port: int = 5000, workers: int = None):
+    workers = workers or os.cpu_count() or 1
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(128)
+    sock.set_inheritable(True)
+
+    # Import setelah socket siap: semua state berat (cascade, model, label map) dimuat sekali di sini
+    import app as app_module
+
+    children = {}
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _run_worker(app_module.app, app_module.proctor, sock.fileno())
+            finally:
+                app_module.progress_writer.flush()
+                os._exit(0)
+        children[pid] = time.monotonic()
+
+    def broadcast(signum, frame):
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGUSR1)
+            except ProcessLookupError:
+                pass
+
+    stopping = []
+
+    def stop(signum, frame):
+        # Sinyal kedua (SIGTERM ulang dari supervisor, Ctrl+C dua kali) tidak boleh memotong loop waitpid di bawah
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        stopping.append(signum)
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGUSR1, broadcast)
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(workers):
+        spawn()
+    print(f"[AI-PROCTOR] Serving on http://{host}:{port} with {workers} worker(s) (master pid {os.getpid()}).")
+
+    try:
+        while not stopping:
+            try:
+                pid, status = os.waitpid(-1, 0)
+            except ChildProcessError:
+                break
+            started = children.pop(pid, None)
+            if started is None:
+                continue
+            print(f"[AI-PROCTOR] Worker {pid} exited (status {status}); restarting.")
+            if time.monotonic() - started < 1.0:
+                time.sleep(1.0)  # jangan respawn beruntun kalau worker langsung crash
+            spawn()
+    except KeyboardInterrupt:
+        pass
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    for pid in list(children):
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    for pid in list(children):
+        try:
+            os.waitpid(pid, 0)
+        except ChildProcessError:
+            pass
+    sock.close()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=5000)
+    ap.add_argument("--workers", type=int, default=None, help="jumlah proses worker (default: jumlah CPU)")
+    args = ap.parse_args()
+    serve(args.host, args.port, args.workers)
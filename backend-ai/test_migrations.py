@@ -0,0 +1,42 @@
+# backend-ai/test_migrations.py
+# Regresi skema: migrasi atomik per versi, dan query panas tetap memakai index (jalankan: python -m pytest -q)
+import sqlite3
+import pytest
+import migrations
+
+
+@pytest.fixture
+def conn(tmp_path):
+    c = sqlite3.connect(str(tmp_path / "test.sqlite3"))
+    yield c
+    c.close()
+
+
+def test_hot_queries_use_indexes(conn):
+    migrations.migrate(conn)
+    assert migrations.check_query_plans(conn) == {}
+
+
+def test_migrate_is_idempotent(conn):
+    version = migrations.migrate(conn)
+    assert version == len(migrations.MIGRATIONS)
+    assert migrations.migrate(conn) == version
+
+
+def test_failed_migration_rolls_back_ddl(conn, monkeypatch):
+    last = len(migrations.MIGRATIONS)
+    name, steps = migrations.MIGRATIONS[-1]
+
+    def fail(_):
+        raise RuntimeError("boom")
+
+    broken = list(migrations.MIGRATIONS)
+    broken[-1] = (name, list(steps) + [fail])
+    monkeypatch.setattr(migrations, "MIGRATIONS", broken)
+    with pytest.raises(RuntimeError):
+        migrations.migrate(conn)
+    assert migrations.schema_version(conn) == last - 1
+
+    # DDL migrasi yang gagal ikut dibatalkan, jadi migrasi ulang berhasil
+    monkeypatch.setattr(migrations, "MIGRATIONS", broken[:-1] + [(name, steps)])
+    assert migrations.migrate(conn) == last
@@ -0,0 +1,100 @@
+# backend-ai/tracker.py
+# Pelacakan wajah antar-frame per sesi proctoring, supaya Haar full-frame tidak jalan di setiap frame.
+import time
+import cv2
+import numpy as np
+from config import TRACK_DETECT_EVERY, TRACK_MARGIN, TRACK_FULL_DETECT_MS, FRAME_DEDUP_THRESHOLD, FRAME_DEDUP_MAX_REUSE, POLL_MIN_MS, POLL_STEP_MS, POLL_MAX_MS
+
+
+class FaceTracker:
+    """
+    Menyimpan bbox terakhir satu user_id. Deteksi penuh hanya dijalankan setiap TRACK_DETECT_EVERY frame
+    (frame hasil dedup ikut dihitung), paling lambat tiap TRACK_FULL_DETECT_MS, saat sesi belum stabil
+    (status terakhir bukan "safe"), atau saat wajah hilang dari jendela pencarian.
+    Di antaranya, deteksi dibatasi ke sekitar bbox sebelumnya.
+    """
+    def __init__(self, detect_every: int = TRACK_DETECT_EVERY, margin: float = TRACK_MARGIN,
+                 full_detect_ms: float = TRACK_FULL_DETECT_MS):
+        self.detect_every = max(1, detect_every)
+        self.margin = margin
+        self.full_detect_every = full_detect_ms / 1000.0
+        self.boxes = []
+        self.since_detect = 0
+        self.detected_at = 0.0
+        self.stable = False
+        self.status = None
+        self.streak = 0
+        self.last_hash = None
+        self.last_key = None
+        self.last_result = None
+        self.reused = 0
+
+    def needs_full_detect(self) -> bool:
+        return (not self.stable or not self.boxes or self.since_detect >= self.detect_every
+                or time.monotonic() - self.detected_at >= self.full_detect_every)
+
+    def windows(self, shape):
+        """Jendela pencarian (x, y, w, h) di sekitar setiap bbox terakhir, dipotong ke batas frame."""
+        H, W = shape[:2]
+        for (x, y, w, h) in self.boxes:
+            mx, my = int(w * self.margin), int(h * self.margin)
+            x0, y0 = max(0, x - mx), max(0, y - my)
+            x1, y1 = min(W, x + w + mx), min(H, y + h + my)
+            yield (x0, y0, x1 - x0, y1 - y0), (w, h)
+
+    def reset(self, faces):
+        self.boxes = [tuple(int(v) for v in f) for f in faces]
+        self.since_detect = 0
+        self.detected_at = time.monotonic()
+
+    def advance(self, faces):
+        self.boxes = [tuple(int(v) for v in f) for f in faces]
+        self.since_detect += 1
+
+    def set_status(self, status: str):
+        self.stable = status == "safe"
+        self.streak = self.streak + 1 if status == self.status else 0
+        self.status = status
+
+    def cached(self, frame_hash, key):
+        """
+        Hasil frame sebelumnya kalau frame ini hampir identik (dan model/label sama), selain itu None.
+        Tidak pernah menggantikan deteksi penuh yang sudah jatuh tempo; frame dedup dihitung seperti frame tracking.
+        """
+        if self.last_result is None or key != self.last_key or self.reused >= FRAME_DEDUP_MAX_REUSE:
+            return None
+        if self.needs_full_detect():
+            return None
+        # Selisih maksimum per sel, bukan rata-rata: wajah kecil yang masuk di pojok frame tetap terdeteksi
+        if int(np.abs(frame_hash - self.last_hash).max()) > FRAME_DEDUP_THRESHOLD:
+            return None
+        self.reused += 1
+        self.since_detect += 1
+        self.set_status(self.status)
+        return self.last_result
+
+    def remember(self, frame_hash, key, result: dict):
+        """Simpan hasil untuk dedup, hanya kalau berasal dari deteksi penuh (frame tracking tidak melihat wajah baru)."""
+        if self.since_detect != 0:
+            self.last_result = None
+            return
+        self.last_hash, self.last_key, self.last_result = frame_hash, key, result
+        self.reused = 0
+
+    def next_interval_ms(self, load: float = 0.0) -> int:
+        """Interval polling berikutnya: rapat saat status bermasalah, makin jarang selama "safe" stabil dan server padat."""
+        if self.status != "safe":
+            return POLL_MIN_MS
+        interval = min(POLL_MAX_MS, POLL_MIN_MS + self.streak * POLL_STEP_MS)
+        return int(min(POLL_MAX_MS * 2, interval * (1.0 + 3.0 * load)))
+
+
+def frame_hash(img_bytes: bytes):
+    """
+    Sidik frame: thumbnail 16x16 grayscale dari JPEG yang di-decode pada 1/8 resolusi (libjpeg melewati sebagian
+    besar IDCT), atau None. Rata-rata per sel meredam noise kamera dan kompresi.
+    """
+    small = cv2.imdecode(np.frombuffer(img_bytes, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if small is None:
+        return None
+    return cv2.resize(small, (16, 16), interpolation=cv2.INTER_AREA).astype(np.int16)
@@ -0,0 +1,154 @@
+# backend-ai/training_queue.py
+# Antrean training di background: /enroll dan /train hanya mendaftarkan job, worker yang melatih model.
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from config import TRAIN_JOBS_DIR, TRAIN_JOB_TTL
+
+
+class TrainingQueue:
+    """
+    Satu worker thread yang menjalankan training di luar request Flask.
+    Permintaan yang masuk selama masih ada job "queued" digabung ke job itu, jadi banyak enroll/train
+    beruntun cukup dilayani satu kali training. Training penuh menggantikan update per user.
+    Status job juga ditulis ke jobs_dir, jadi /train/status tetap terjawab walau request polling
+    mendarat di worker lain (serve.py). Thread worker dibuat ulang di proses hasil fork.
+    """
+    MAX_HISTORY = 200
+
+    def __init__(self, proctor, jobs_dir: str = TRAIN_JOBS_DIR):
+        self.proctor = proctor
+        self.jobs_dir = jobs_dir
+        os.makedirs(jobs_dir, exist_ok=True)
+        self._prune()
+        self._start()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._start)
+
+    def _start(self):
+        self._cond = threading.Condition()
+        self._pending = None
+        self._jobs = OrderedDict()
+        self._thread = threading.Thread(target=self._worker, daemon=True)
+        self._thread.start()
+
+    def _persist(self, job: dict):
+        try:
+            tmp = os.path.join(self.jobs_dir, job["job_id"] + ".json.tmp")
+            with open(tmp, "w") as f:
+                json.dump(job, f)
+            os.replace(tmp, os.path.join(self.jobs_dir, job["job_id"] + ".json"))
+        except Exception:
+            pass
+
+    def _forget(self, job_id: str):
+        try:
+            os.remove(os.path.join(self.jobs_dir, job_id + ".json"))
+        except Exception:
+            pass
+
+    def _prune(self):
+        """
+        Buang file job dari run sebelumnya / worker lain: yang lebih tua dari TRAIN_JOB_TTL, lalu job selesai
+        terlama di atas MAX_HISTORY. Job yang belum selesai dan masih baru dibiarkan (mungkin milik worker lain).
+        """
+        now = time.time()
+        finished = []
+        try:
+            names = os.listdir(self.jobs_dir)
+        except Exception:
+            return
+        for fn in names:
+            path = os.path.join(self.jobs_dir, fn)
+            try:
+                mtime = os.path.getmtime(path)
+                if now - mtime > TRAIN_JOB_TTL:
+                    os.remove(path)
+                    continue
+                if not fn.endswith(".json"):
+                    continue
+                with open(path) as f:
+                    if json.load(f).get("status") in ("done", "failed"):
+                        finished.append((mtime, path))
+            except Exception:
+                pass
+        finished.sort()
+        for _, path in finished[:max(0, len(finished) - self.MAX_HISTORY)]:
+            try:
+                os.remove(path)
+            except Exception:
+                pass
+
+    def submit(self, user_id: str = None) -> str:
+        """Daftarkan training untuk user_id (incremental) atau seluruh dataset (user_id=None)."""
+        with self._cond:
+            job = self._pending
+            if job is None:
+                job = {
+                    "job_id": uuid.uuid4().hex[:12],
+                    "status": "queued",
+                    "full": False,
+                    "users": [],
+                    "success": None,
+                    "created_at": datetime.utcnow().isoformat(),
+                    "finished_at": None,
+                }
+                self._pending = job
+                self._jobs[job["job_id"]] = job
+                while len(self._jobs) > self.MAX_HISTORY:
+                    self._forget(self._jobs.popitem(last=False)[0])
+            if user_id is None:
+                job["full"] = True
+            elif user_id not in job["users"]:
+                job["users"].append(user_id)
+            self._persist(job)
+            self._cond.notify()
+            return job["job_id"]
+
+    def status(self, job_id: str = None) -> dict:
+        with self._cond:
+            if job_id:
+                job = self._jobs.get(job_id)
+                if job:
+                    return dict(job)
+                try:
+                    with open(os.path.join(self.jobs_dir, os.path.basename(job_id) + ".json")) as f:
+                        return json.load(f)
+                except Exception:
+                    return None
+            running = [j["job_id"] for j in self._jobs.values() if j["status"] == "running"]
+            return {
+                "queued": self._pending["job_id"] if self._pending else None,
+                "running": running[0] if running else None,
+                "model_ready": self.proctor.model_ready,
+            }
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while self._pending is None:
+                    self._cond.wait()
+                job = self._pending
+                self._pending = None
+                job["status"] = "running"
+                self._persist(job)
+
+            try:
+                if job["full"]:
+                    ok = self.proctor.train_model()
+                else:
+                    ok = all([self.proctor.train_incremental(uid) for uid in job["users"]])
+            except Exception as e:
+                print(f"[ERROR] Training job {job['job_id']} failed: {e}")
+                ok = False
+
+            with self._cond:
+                job["success"] = bool(ok)
+                job["status"] = "done" if ok else "failed"
+                job["finished_at"] = datetime.utcnow().isoformat()
+                self._persist(job)
+            self._prune()
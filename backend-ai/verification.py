@@ -0,0 +1,106 @@
+# backend-ai/verification.py
+# Verifikasi 1:1 untuk proctoring: wajah hanya dibandingkan dengan histogram LBPH milik user yang diklaim.
+import threading
+import numpy as np
+import cv2
+from config import VERIFY_COHORT_SIZE
+
+
+def chi_square_alt(hists, q):
+    """
+    Jarak HISTCMP_CHISQR_ALT (yang dipakai LBPH predict) antara setiap baris hists dan histogram q, dihitung oleh
+    cv2.compareHist sendiri. Segmen model sudah float32 kontigu, jadi baris mmap langsung dipakai tanpa salinan;
+    hanya segmen float16 format lama yang dikonversi per panggilan.
+    """
+    hists = np.asarray(hists, dtype=np.float32)
+    return np.fromiter((cv2.compareHist(h, q, cv2.HISTCMP_CHISQR_ALT) for h in hists), dtype=np.float64, count=len(hists))
+
+
+class VerificationEngine:
+    """
+    Histogram training LBPH (dari ModelStore) dipartisi per label, sehingga verify() cukup O(jumlah crop satu user)
+    alih-alih predict() 1:N ke seluruh histogram semua user.
+    Opsional: kohort impostor berisi VERIFY_COHORT_SIZE prototipe user lain yang paling mirip dengan user
+    yang diklaim; kalau wajah lebih dekat ke salah satu prototipe itu, verifikasi ditolak.
+    """
+    def __init__(self, radius=2, neighbors=8, grid_x=8, grid_y=8, cohort_size: int = VERIFY_COHORT_SIZE):
+        self.params = dict(radius=radius, neighbors=neighbors, grid_x=grid_x, grid_y=grid_y)
+        self.cohort_size = cohort_size
+        self._local = threading.local()
+        self._state = ({}, None, None, {}, None)
+
+    def __contains__(self, label):
+        return label in self._state[0]
+
+    def load(self, model: dict):
+        """
+        model: hasil ModelStore.load() (segmen hist/labels terurut per label, protos per label).
+        Partisi per label hanyalah daftar slice dari array mmap tiap segmen, jadi tidak ada salinan histogram per proses.
+        """
+        if not model or len(model["labels"]) == 0:
+            self._state = ({}, None, None, {}, None)
+            return
+        parts = {}
+        for seg in model["segments"]:
+            labels = np.asarray(seg["labels"])
+            uniq, starts = np.unique(labels, return_index=True)
+            bounds = list(starts) + [len(labels)]
+            for i, lb in enumerate(uniq):
+                parts.setdefault(int(lb), []).append(seg["hist"][bounds[i]:bounds[i + 1]])
+        flat = [(seg["hist"], np.asarray(seg["labels"])) for seg in model["segments"]]
+        self._state = (parts, np.asarray(model["proto_labels"]), model["protos"], {}, flat)
+
+    def histogram(self, face_roi):
+        """Histogram LBPH untuk satu crop, dihitung oleh OpenCV sendiri supaya identik dengan histogram training."""
+        lbph = getattr(self._local, "lbph", None)
+        if lbph is None:
+            lbph = cv2.face.LBPHFaceRecognizer_create(**self.params)
+            self._local.lbph = lbph
+        lbph.train([face_roi], np.array([0]))
+        return lbph.getHistograms()[0].ravel().astype(np.float32)
+
+    def _cohort(self, state, label):
+        proto_labels, protos, cohorts = state[1:4]
+        if label not in cohorts:
+            idx = int(np.nonzero(proto_labels == label)[0][0])
+            others = np.nonzero(proto_labels != label)[0]
+            if self.cohort_size <= 0 or len(others) == 0:
+                cohorts[label] = np.zeros((0, protos.shape[1]), dtype=np.float32)
+            else:
+                d = chi_square_alt(np.asarray(protos[others], dtype=np.float32), np.asarray(protos[idx], dtype=np.float32))
+                near = others[np.argsort(d)[:self.cohort_size]]
+                cohorts[label] = np.asarray(protos[near], dtype=np.float32)
+        return cohorts[label], np.asarray(protos[int(np.nonzero(proto_labels == label)[0][0])], dtype=np.float32)
+
+    def verify(self, face_roi, label: int, threshold: float):
+        """Mengembalikan (cocok, jarak) untuk klaim bahwa face_roi adalah label."""
+        state = self._state
+        parts = state[0]
+        if label not in parts:
+            return False, 999.0
+        q = self.histogram(face_roi)
+        dist = min(float(np.min(chi_square_alt(p, q))) for p in parts[label])
+        if dist >= threshold:
+            return False, dist
+        cohort, proto = self._cohort(state, label)
+        if len(cohort):
+            own = float(chi_square_alt(proto[None, :], q)[0])
+            if float(np.min(chi_square_alt(cohort, q))) < own:
+                return False, dist
+        return True, dist
+
+    def identify(self, face_roi, threshold: float):
+        """Pencarian 1:N (pengganti LBPH predict) atas semua histogram, langsung dari mmap tiap segmen. Mengembalikan (label, jarak)."""
+        flat = self._state[4]
+        if not flat:
+            return -1, 999.0
+        q = self.histogram(face_roi)
+        best_label, best_dist = -1, float("inf")
+        for hists, labels in flat:
+            d = chi_square_alt(hists, q)
+            j = int(np.argmin(d))
+            if d[j] < best_dist:
+                best_label, best_dist = int(labels[j]), float(d[j])
+        if best_dist >= threshold:
+            return -1, best_dist
+        return best_label, best_dist